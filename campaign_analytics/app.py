@@ -1,11 +1,24 @@
+import os
 import streamlit as st
 import pandas as pd
 import warnings
-import plotly.express as px
+from collections import deque
 from datetime import datetime
 from features.database import *
 from features.leaderboard import *
 from features.image_search import *
+from features.image_cache import ImageCache
+from features.dataset import load_dataset, ingest_csv_chunked, IncrementalLoader
+from features.mapped_store import MappedStoreLoader
+from features.sql_backend import SqlCampaignStore
+from features.parallel import configure_parallelism
+from features.aggregation import aggregate_metrics
+from features.rollup import build_rollups, select_rollup
+from features.date_index import DateIndex
+from features.activity_index import CampaignActivityIndex
+from features.downsample import downsample
+from features.instrumentation import recorder, span, HISTORY_SIZE
+from features.shared_cache import shared_cache
 # Ignore warnings
 warnings.filterwarnings('ignore')
 
@@ -44,43 +57,212 @@ st.markdown(custom_css, unsafe_allow_html=True)
 st.markdown('<div class="title-container"><img src="https://cdn.iconscout.com/icon/premium/png-512-thumb/marketing-analysis-3141395-2615916.png?f=webp&w=512" alt="Image" width="100"/><h1 class="title-text">Campaign Analytics</h1></div>', unsafe_allow_html=True)
 
 # Set application screens
-tab1, tab2, tab3 = st.tabs(["Campaign Stats", "Leaderboard", "Image Search"])
+VIEWS = ["Campaign Stats", "Leaderboard", "Image Search"]
 
 # Set up Google Images Search API credentials
 GCS_DEVELOPER_KEY = "YOUR_GOOGLE_CLOUD_API_KEY"
 GCS_CX = "85e8759d62c1e48d5"
 
-gis = GoogleImagesSearch(GCS_DEVELOPER_KEY, GCS_CX)
+# Largest (width, height) of the search result images shown in the Image Search tab
+THUMBNAIL_SIZE = (1024, 1024)
+
+# On-disk cache of downloaded images and its disk budget
+IMAGE_CACHE_DIR = "image_cache"
+IMAGE_CACHE_BYTES = 512 * 2 ** 20
+
+# Campaign data file
+DATA_PATH = "input_data/data_year2023.csv"
+
+# Files larger than this are streamed into rollups in chunks of at most INGEST_MEMORY_MB
+STREAMING_INGEST_BYTES = 1024 * 2 ** 20
+INGEST_MEMORY_MB = 256
+
+# Where each app process keeps the rollups: 'memory' builds them in the process, 'mmap' maps one
+# Arrow file shared by every app process on the host, rebuilt by the first process to see a new CSV
+DATA_STORE = os.environ.get("CAMPAIGN_ANALYTICS_DATA_STORE", "memory")
+
+# Where the dashboard's queries run: 'pandas' over the rollups in memory (the reference), or 'sql' in an
+# embedded database that holds the data instead, SQLite next to the CSV file unless CAMPAIGN_ANALYTICS_SQL_URL is set
+BACKEND = os.environ.get("CAMPAIGN_ANALYTICS_BACKEND", "pandas")
+SQL_URL = os.environ.get("CAMPAIGN_ANALYTICS_SQL_URL")
+
+# Memory budget of the indexes and aggregates shared by every session; the least recently used are evicted beyond it
+SHARED_CACHE_BYTES = 1024 * 2 ** 20
+shared_cache.max_bytes = SHARED_CACHE_BYTES
+
+# Worker processes summing large datasets by media buyer; unset uses up to 8 cores, 1 keeps aggregation in-process
+if os.environ.get("CAMPAIGN_ANALYTICS_WORKERS"):
+    configure_parallelism(workers=int(os.environ["CAMPAIGN_ANALYTICS_WORKERS"]))
+
+# Rollup levels used by the Campaign Stats and Leaderboard views
+CAMPAIGN_LEVEL = ("ACTIVITY_DATE", "MEDIA_BUYER", "CAMPAIGN")
+BUYER_LEVEL = ("ACTIVITY_DATE", "MEDIA_BUYER")
+
+# Metrics charted in the Campaign Stats view, in display order, with their chart labels
+CAMPAIGN_CHARTS = [
+    ("DAILY_RETURN", "Daily Return"),
+    ("TOTAL_RETURN", "Total Return"),
+    ("DAILY_PROFIT", "Daily Profit"),
+    ("TOTAL_PROFIT", "Total Profit"),
+    ("SPEND", "Spend"),
+    ("REVENUE", "Revenue"),
+    ("SPEND_PER_ARRIVAL", "Spend Per Arrival"),
+    ("REVENUE_PER_ARRIVAL", "Revenue Per Arrival"),
+    ("PROFIT_PER_ARRIVAL", "Profit Per Arrival"),
+    ("ACCEPTANCE_RATE", "Acceptance Rate"),
+]
+CAMPAIGN_METRICS = [metric for metric, _ in CAMPAIGN_CHARTS]
+
+# Width of the Campaign Stats charts in pixels; longer series are downsampled to about one point per pixel
+CHART_WIDTH = 800
+CHART_POINT_BUDGET = CHART_WIDTH
+
+# Optional exports of the per-rerun timings: a Prometheus text file and a rotating JSON-lines log.
+# Reruns are timed only while one of these is set or the sidebar performance panel is open.
+PERF_METRICS_PATH = os.environ.get("CAMPAIGN_ANALYTICS_METRICS_FILE")
+PERF_LOG_PATH = os.environ.get("CAMPAIGN_ANALYTICS_PERF_LOG")
+recorder.configure(prometheus_path=PERF_METRICS_PATH, log_path=PERF_LOG_PATH)
+
+@st.cache_resource
+def get_search_client():
+    """
+    Creates the Google Images Search client shared by every session, on the first search.
 
-@st.cache_data
-def read_data(filepath):
+    Returns:
+    - GoogleImagesSearch: The search client.
+    """
+    return create_search_client(GCS_DEVELOPER_KEY, GCS_CX)
+
+@st.cache_resource
+def get_image_cache():
+    """
+    Creates the on-disk image cache shared by every session.
+
+    Returns:
+    - ImageCache: The image cache.
+    """
+    return ImageCache(IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_BYTES)
+
+def build_campaign_rollups(filepath):
     """
-    Reads data from a CSV file and returns it as a DataFrame.
+    Builds the daily rollups of the whole campaign data file.
 
     Parameters:
     - file_path (str): The path to the CSV file.
 
     Returns:
-    - pd.DataFrame: The loaded DataFrame.
+    - dict: The rollups keyed by (date, buyer, campaign), (date, buyer) and (date).
+    """
+    # Stream large files so the raw rows never have to fit in memory
+    if os.path.getsize(filepath) > STREAMING_INGEST_BYTES:
+        rollups, _ = ingest_csv_chunked(filepath, max_memory_mb=INGEST_MEMORY_MB)
+        return rollups
+    # Read smaller files through their columnar store
+    return build_rollups(load_dataset(filepath))
+
+@st.cache_resource
+def get_data_loader(filepath):
     """
-    df = pd.read_csv(filepath)
-    df['ACTIVITY_DATE'] = pd.to_datetime(df['ACTIVITY_DATE'], format="%Y-%m-%d")
-    # Return DatFrame with correct data type
-    return df
+    Creates the loader that keeps the rollups of a data file up to date.
 
-@st.cache_data
-def max_date(dataframe):
+    Parameters:
+    - file_path (str): The path to the CSV file.
+
+    Returns:
+    - IncrementalLoader, MappedStoreLoader or SqlCampaignStore: The loader shared by every session,
+      as selected by BACKEND and DATA_STORE.
+    """
+    if BACKEND == "sql":
+        return SqlCampaignStore(filepath, url=SQL_URL)
+    if DATA_STORE == "mmap":
+        return MappedStoreLoader(filepath, full_load=build_campaign_rollups)
+    return IncrementalLoader(filepath, full_load=build_campaign_rollups)
+
+def refresh_data(filepath):
     """
-    Finds and returns the maximum date in a DataFrame.
+    Ingests any rows appended to the data file since the last rerun.
 
     Parameters:
-    - df (pd.DataFrame): The DataFrame containing date information.
+    - file_path (str): The path to the CSV file.
+
+    Returns:
+    - DatasetVersion: The version token of the loaded data. It hashes in constant time, so the
+      caches derived from the data key on it rather than on DataFrames.
+    """
+    loader = get_data_loader(filepath)
+    loader.refresh()
+
+    # Account for the one copy of the dataset every session reads from
+    shared_cache.pin(("dataset", filepath), loader.handle)
+    return loader.version
+
+def get_dataset(version):
+    """
+    Returns the loaded dataset of a version token, with its rollups and precomputed statistics.
+
+    Parameters:
+    - version (DatasetVersion): The data version returned by refresh_data.
 
     Returns:
-    - datetime: The maximum date.
+    - DatasetHandle: The dataset's version, rollups and statistics.
+    """
+    return get_data_loader(version.path).handle
+
+@shared_cache.memoize
+def load_date_index(version, level):
+    """
+    Builds a sorted date index over one rollup of the campaign data, with lookups by the rollup's keys.
+
+    Parameters:
+    - version (DatasetVersion): The data version returned by refresh_data.
+    - level (tuple): The key columns of the rollup to index.
+
+    Returns:
+    - DateIndex: The date index over the rollup.
+    """
+    return DateIndex(select_rollup(get_dataset(version).rollups, level), keys=[level[1:]] if len(level) > 1 else [])
+
+@shared_cache.memoize
+def load_activity_index(version):
     """
-    # Return the most recent Date
-    return dataframe['ACTIVITY_DATE'].max()
+    Builds the active days of every media buyer and campaign once per data version.
+
+    Parameters:
+    - version (DatasetVersion): The data version returned by refresh_data.
+
+    Returns:
+    - CampaignActivityIndex: The activity index over the (date, buyer, campaign) rollup.
+    """
+    return CampaignActivityIndex(select_rollup(get_dataset(version).rollups, CAMPAIGN_LEVEL))
+
+@shared_cache.memoize
+def load_leaderboard_index(version):
+    """
+    Builds the per-media-buyer prefix sums of total profit once per data version.
+
+    Parameters:
+    - version (DatasetVersion): The data version returned by refresh_data.
+
+    Returns:
+    - LeaderboardIndex: The leaderboard index over the (date, buyer) rollup.
+    """
+    return LeaderboardIndex(select_rollup(get_dataset(version).rollups, BUYER_LEVEL))
+
+@shared_cache.memoize
+def load_rank_history(version, frequency):
+    """
+    Computes every media buyer's rolling profit and rank for every date once per data version and window.
+
+    Parameters:
+    - version (DatasetVersion): The data version returned by refresh_data.
+    - frequency (str): The leaderboard window ('weekly', 'monthly' or 'yearly').
+
+    Returns:
+    - tuple: The (date x media buyer) totals and rankings DataFrames.
+    """
+    if BACKEND == "sql":
+        return generate_rank_history(get_data_loader(version.path).buyer_daily_totals(), frequency)
+    return generate_rank_history(select_rollup(get_dataset(version).rollups, BUYER_LEVEL), frequency)
 
 @st.cache_data
 def roll_back_days(most_recent_date, days_to_roll_back):
@@ -99,444 +281,477 @@ def roll_back_days(most_recent_date, days_to_roll_back):
 
     return rolled_back_date
 
+@shared_cache.memoize
+def media_buyer_options(version, start, end):
+    """
+    Lists the media buyers active within a date window.
+
+    Parameters:
+    - version (DatasetVersion): The data version returned by refresh_data.
+    - start (datetime): The first date of the window, or None for no lower bound.
+    - end (datetime): The last date of the window, or None for no upper bound.
+
+    Returns:
+    - list: The media buyers.
+    """
+    if BACKEND == "sql":
+        return get_data_loader(version.path).media_buyers(start, end)
+    return load_activity_index(version).buyers(start, end)
+
+@shared_cache.memoize
+def campaign_options(version, media_buyer, start, end):
+    """
+    Lists the campaigns of a media buyer active within a date window.
+
+    Parameters:
+    - version (DatasetVersion): The data version returned by refresh_data.
+    - media_buyer (str): The media buyer.
+    - start (datetime): The first date of the window.
+    - end (datetime): The last date of the window.
+
+    Returns:
+    - list: The campaigns.
+    """
+    if BACKEND == "sql":
+        return get_data_loader(version.path).campaigns(media_buyer, start, end)
+    return load_activity_index(version).campaigns(media_buyer, start, end)
+
+@shared_cache.memoize
+def campaign_daily_metrics(version, media_buyer, campaign, start, end):
+    """
+    Sums every charted metric of a campaign for each activity date within a date window.
+
+    Parameters:
+    - version (DatasetVersion): The data version returned by refresh_data.
+    - media_buyer (str): The media buyer.
+    - campaign (str): The campaign.
+    - start (datetime): The first date of the window.
+    - end (datetime): The last date of the window.
+
+    Returns:
+    - pd.DataFrame: The metrics indexed by activity date.
+    """
+    if BACKEND == "sql":
+        return get_data_loader(version.path).daily_metrics(media_buyer, campaign, start, end, CAMPAIGN_METRICS)
+    rows = load_date_index(version, CAMPAIGN_LEVEL).lookup(
+        {"MEDIA_BUYER": media_buyer, "CAMPAIGN": campaign}, start, end
+    )
+    return aggregate_metrics(rows, CAMPAIGN_METRICS)
+
+@st.cache_data(max_entries=256)
+def campaign_metric_figure(version, timelines, media_buyer, campaign, start, end, metric, full_resolution):
+    """
+    Builds the line chart of one campaign metric, caching the serialized figure on the chart's inputs.
+
+    Parameters:
+    - version (DatasetVersion): The data version returned by refresh_data.
+    - timelines (str): The selected time window, shown in the chart title.
+    - media_buyer (str): The media buyer.
+    - campaign (str): The campaign.
+    - start (datetime): The first date of the window.
+    - end (datetime): The last date of the window.
+    - metric (str): The metric to chart, one of CAMPAIGN_CHARTS.
+    - full_resolution (bool): Whether to plot every day instead of a downsampled series.
+
+    Returns:
+    - plotly.graph_objects.Figure: The line chart.
+    """
+    # Plotly Express takes a quarter of a second to import, so it is loaded by the first chart
+    import plotly.express as px
+
+    label = dict(CAMPAIGN_CHARTS)[metric]
+    daily_metrics = campaign_daily_metrics(version, media_buyer, campaign, start, end)
+
+    # Downsample long series to the chart's point budget unless full resolution is requested
+    chart_data = daily_metrics if full_resolution else downsample(daily_metrics, metric, CHART_POINT_BUDGET)
+
+    # Create a line chart using Plotly Express
+    fig = px.line(data_frame=chart_data,
+        x=chart_data.index,
+        y=metric,
+        title=f"{label} over the last {timelines}"
+        )
+
+    # Customize chart layout
+    fig.update_layout(xaxis_title="Time Period", yaxis_title=label, height=600, width=CHART_WIDTH)
+
+    return fig
+
+@shared_cache.memoize
+def compute_leaderboard(version, end_date, frequency):
+    """
+    Generates the leaderboard of one window.
+
+    Parameters:
+    - version (DatasetVersion): The data version returned by refresh_data.
+    - end_date (str): The end date of the window in 'YYYY-MM-DD' format.
+    - frequency (str): The leaderboard window ('weekly', 'monthly' or 'yearly').
+
+    Returns:
+    - pd.DataFrame: The leaderboard.
+    """
+    if BACKEND == "sql":
+        return get_data_loader(version.path).leaderboard(end_date, frequency)
+    return load_leaderboard_index(version).leaderboards([frequency_window(end_date, frequency)])[0]
+
+def render_campaign_stats(data_version):
+    """
+    Renders the Campaign Stats view and the settings sidebar.
+
+    Lets the user select a time window, media buyer, and campaign, and displays
+    the campaign's metrics using Plotly charts.
+
+    Parameters:
+    - data_version (DatasetVersion): The data version returned by refresh_data.
+    """
+    stats = get_dataset(data_version).stats
+
+    # Get the most recent date from the precomputed dataset statistics
+    most_recent_date = stats.max_date
+
+    # Create a radio button to select a time window
+    timelines = st.radio(label="Select a Time Window", options=["7 Days", "14 Days", "Lifetime"], horizontal=True)
+
+    # Split the layout into three columns
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        # Create a text input for the start date
+        end_date_main = st.date_input("Start Date", most_recent_date)
+
+        # Calculate the starting date by rolling back from the most recent date,
+        # or use the earliest date in the data for "Lifetime"
+        if timelines == "7 Days":
+            starting = roll_back_days(most_recent_date, 7)
+        elif timelines == "14 Days":
+            starting = roll_back_days(most_recent_date, 14)
+        else:
+            starting = stats.min_date
+
+        # Create a text input for the end date
+        start_date_main = st.date_input("End Date", starting)
+
+        # if end_date_main and start_date_main:
+        #     df = df.loc[(df['ACTIVITY_DATE'] >= start_date_main) & (df['ACTIVITY_DATE'] <= end_date_main)]
+
+    # Within the second column
+    with col2:
+        # Create a selectbox for choosing a media buyer active within the selected time window
+        media_buyer = st.selectbox(
+            'Select a media buyer',
+            media_buyer_options(data_version, starting, most_recent_date)
+        )
+
+    # Within the third column
+    with col3:
+        # Create a number input for specifying the number of active days
+        active_days = st.number_input('Active within (days)', min_value=1, step=1, value=15)
+
+        # Create a checkbox to plot every point, for zooming into long windows
+        full_resolution = st.checkbox("Full resolution charts", help="Plot every day instead of a downsampled series that keeps the peaks and troughs.")
+
+    campaign_start, campaign_end = starting, most_recent_date
+    if active_days:
+        # Intersect the active window with the selected time window; activity dates have no
+        # time of day, so the window is rounded inwards to whole days
+        end_date = datetime.today()
+        start_date = roll_back_days(end_date, active_days)
+        campaign_start = max(pd.Timestamp(starting), pd.Timestamp(start_date).ceil("D"))
+        campaign_end = min(pd.Timestamp(most_recent_date), pd.Timestamp(end_date).floor("D"))
+
+    with col2:
+        # Create a selectbox for choosing a campaign
+        campaign = st.selectbox(
+            'Select a campaign',
+            campaign_options(data_version, media_buyer, campaign_start, campaign_end)
+        )
+
+    for metric, _ in CAMPAIGN_CHARTS:
+        with span(f"chart {metric}"):
+            # Build the chart, or reuse it if its inputs have not changed
+            fig = campaign_metric_figure(data_version, timelines, media_buyer, campaign,
+                                         campaign_start, campaign_end, metric, full_resolution)
+
+            # Display the chart using Streamlit
+            st.plotly_chart(fig, use_container_width=True, theme=None)
+
+    with span("settings sidebar"):
+        render_settings_sidebar(data_version, {
+            "time_line": timelines,
+            "start_date": str(end_date_main),
+            "end_date": str(start_date_main),
+            "media_buyer": media_buyer,
+            "active_days": active_days,
+            "campaign": campaign
+        })
+
+def render_settings_sidebar(data_version, settings):
+    """
+    Renders the sidebar that shows, saves and loads Campaign Stats settings.
+
+    Parameters:
+    - data_version (DatasetVersion): The data version returned by refresh_data.
+    - settings (dict): The current Campaign Stats settings.
+    """
+    with st.sidebar:
+        # Display Current Settings
+        st.header("Current Settings")
+        st.info(f"Time window: {settings['time_line']}")
+        st.info(f"Start Date: {settings['start_date'].split(' ')[0].replace('-', '/')}") # Format for conformity with streamlit date input
+        st.info(f"End Date: {settings['end_date'].split(' ')[0].replace('-', '/')}") # Format for conformity with streamlit date input
+        st.info(f"Media buyer: {settings['media_buyer']}")
+        st.info(f"Active within (days): {settings['active_days']}")
+        st.info(f"Campaign: {settings['campaign']}")
+
+        st.header("Save Current Settings")
+
+        # Every media buyer in the data can save and load settings
+        users = list(get_dataset(data_version).stats.buyers)
+
+        # Prompt for user name
+        user_name = st.selectbox(
+            'Select a user:',
+            users
+        )
+
+        # Prompt for profile name
+        profile_name = st.text_input("Enter a new profile name:")
+
+        # Save button to save the current settings
+        save_preset = st.button("Save Settings")
+
+        if save_preset:
+            save_profile(user_name, profile_name, settings)
+            st.success(f"Settings for {user_name} saved!")
+
+        # Display Saved Settings
+        st.header("Load Saved Settings")
+
+        # Prompt for user to select
+        user = st.selectbox(
+            'User:',
+            users
+        )
+        if user:
+            # Load profiles for the selected user
+            settings_df = load_profile(user_name=user)
+        # Prompt for profile name
+        profile_df = settings_df[settings_df["user_name"]==user]
+        settings_profile = st.selectbox(
+            'Saved settings:',
+            profile_df['profile_name'].tolist()
+        )
+        if settings_profile:
+            # Retrieve saved settings for the selected profile
+            saved_settings = settings_df[
+                (settings_df["user_name"]==user) & (settings_df["profile_name"]==settings_profile)
+            ]['settings']
+            result_dict = saved_settings.values[0]
+
+        # Display saved settings
+        st.info(f"Time window: {result_dict['time_line']}")
+        st.info(f"Start Date: {result_dict['start_date'].split(' ')[0].replace('-', '/')}") # Format for conformity with streamlit date input
+        st.info(f"End Date: {result_dict['end_date'].split(' ')[0].replace('-', '/')}") # Format for conformity with streamlit date input
+        st.info(f"Media buyer: {result_dict['media_buyer']}")
+        st.info(f"Active within (days): {result_dict['active_days']}")
+        st.info(f"Campaign: {result_dict['campaign']}")
+
+def render_leaderboard(data_version):
+    """
+    Renders the Leaderboard view and its visualization sidebar.
+
+    Parameters:
+    - data_version (DatasetVersion): The data version returned by refresh_data.
+    """
+    # Split the layout into three columns
+    col4, col5, col6 = st.columns(3)
+
+    # Create a radio button to select a time window
+    with col4:
+        leaderboard_timelines = st.radio(label="Select a Time Window", options=["weekly", "monthly", "yearly"], horizontal=True)
+
+    # Create visualization options in the sidebar
+    with st.sidebar:
+        st.title("Visualize Leaderboard")
+        col7, col8 = st.columns(2)
+
+        # Visualization checkboxes
+        with col7:
+            pie_chart = st.checkbox("Pie chart")
+            vertical_bar_chart = st.checkbox("Vertical Bar chart")
+            rank_chart = st.checkbox("Rank over time")
+        with col8:
+            line_chart = st.checkbox("Line chart")
+            horizontal_bar_chart = st.checkbox("Horizontal Bar chart")
+
+    # Get end date from user input
+    with col4:
+        end_date_leaderboard = st.date_input("End date", get_dataset(data_version).stats.max_date)
+
+    # Generate leaderboard based on selected time window
+    leaderboard = compute_leaderboard(data_version, str(end_date_leaderboard), leaderboard_timelines)
+
+    # Toggle to show/hide the leaderboard
+    show_leaderboard = st.toggle('Show Leaderboard')
+
+    # Display the leaderboard if toggled on
+    if show_leaderboard:
+        st.dataframe(leaderboard,
+                    column_order=("RANKING", "NAME", "DOLLAR_AMOUNT", "PERCENTAGE"),
+                    height=200,
+                    use_container_width=False,
+                    hide_index=True
+                    )
+    # Plotly Charts based on user selections
+    import plotly.express as px
+
+    if pie_chart:
+        # Create a Pie Chart using the 'Percentage' column
+        fig_pie_percentage = px.pie(leaderboard, names='NAME', values='DOLLAR_AMOUNT', title='Pie Chart (Percentage)')
+        fig_pie_percentage.update_layout(height=600, width=800)
+        st.plotly_chart(fig_pie_percentage, use_container_width=True, theme=None)
+
+    if vertical_bar_chart:
+        # Create a Vertical Bar Chart
+        fig_vertical_bar = px.bar(leaderboard, x='NAME', y='DOLLAR_AMOUNT', title='Vertical Bar Chart')
+        fig_vertical_bar.update_layout(xaxis_title="Name", yaxis_title="Amount [USD]",height=600, width=800)
+        st.plotly_chart(fig_vertical_bar, use_container_width=True, theme=None)
+
+    if horizontal_bar_chart:
+        # Create a Horizontal Bar Chart
+        fig_horizontal_bar = px.bar(leaderboard.sort_values(by="DOLLAR_AMOUNT",ascending=True),
+                                    x='DOLLAR_AMOUNT', y='NAME', orientation='h', title='Horizontal Bar Chart')
+        fig_horizontal_bar.update_layout(xaxis_title="Amount [USD]", yaxis_title="Name",height=600, width=800)
+        st.plotly_chart(fig_horizontal_bar, use_container_width=True, theme=None)
+
+    if line_chart:
+        # Create a Line Chart
+        fig_line = px.line(leaderboard, x='NAME', y='PERCENTAGE', title='Line Chart')
+        fig_line.update_layout(xaxis_title="Name", yaxis_title="Percentage",height=600, width=800)
+        st.plotly_chart(fig_line, use_container_width=True, theme=None)
+
+    if rank_chart:
+        # Create a Line Chart of each media buyer's rank for every end date
+        _, rankings = load_rank_history(data_version, leaderboard_timelines)
+        rank_history = rankings.melt(ignore_index=False, var_name="NAME", value_name="RANKING").reset_index()
+        fig_rank = px.line(rank_history, x="ACTIVITY_DATE", y="RANKING", color="NAME", title=f"Rank over time ({leaderboard_timelines})")
+        fig_rank.update_layout(xaxis_title="End Date", yaxis_title="Ranking",height=600, width=800)
+        fig_rank.update_yaxes(autorange="reversed", dtick=1)
+        st.plotly_chart(fig_rank, use_container_width=True, theme=None)
+
+def render_image_search():
+    """
+    Renders the Image Search view.
+    """
+    # Set the title of the Streamlit app
+    st.title("Image Search and Download")
+
+    # Take user input for image search query
+    query = st.text_input("Enter your image search query:")
+
+    # Check if the "Search" button is clicked
+    if st.button("Search"):
+        # Prepare parameters for Google Images Search
+        search_params = {
+            'q': query,
+            'num': 5,  # Number of images to retrieve
+            'safe': 'off',  # Disable safe search
+        }
+
+        # Perform Google Images Search, reusing the results of a recent identical search
+        results = search_images(get_search_client(), search_params)
+
+        # Download and thumbnail every search result concurrently
+        thumbnails = download_images(results, thumbnail_size=THUMBNAIL_SIZE, cache=get_image_cache())
+
+        # Display images in the search results
+        for image, thumbnail in zip(results, thumbnails):
+            # Get the URL and description of the image
+            image_url, image_description = display_image(image)
+
+            # Display the image with its caption, letting the browser fetch it if the download failed
+            st.image(thumbnail if thumbnail is not None else image_url, caption=image_description, use_column_width=True)
+
+            # Check if the "Download" button is clicked for the current image
+            if st.button("Download"):
+                # Download the image
+                img = download_image(image, cache=get_image_cache())
+
+                # Prompt the user to choose where to save the image
+                file_path = st.file_uploader("Choose where to save the image:", type="png")
+
+                # Check if the user has chosen a file path
+                if file_path:
+                    # Save the image to the specified file path
+                    img.save(file_path, "PNG")
+                    st.success(f"Image saved to {file_path}")
+
+def render_performance_panel(history):
+    """
+    Renders the timings of the most recent reruns and the memory held by the shared cache in the sidebar.
+
+    Parameters:
+    - history (deque): This session's recorded reruns, newest last.
+    """
+    with st.sidebar:
+        st.header("Performance")
+        if not history:
+            st.caption("No reruns recorded yet.")
+            return
+
+        # One row per rerun, newest first, with the total seconds spent in each stage
+        rows = []
+        for rerun in reversed(history):
+            row = {"started": datetime.fromtimestamp(rerun["started"]).strftime("%H:%M:%S"), "rerun": rerun["seconds"]}
+            for name, _, seconds in rerun["spans"]:
+                row[name] = row.get(name, 0.0) + seconds
+            rows.append(row)
+        st.dataframe(pd.DataFrame(rows).set_index("started"), use_container_width=True)
+
+        # Break the latest rerun down by stage, nested stages indented under their caller
+        latest = history[-1]
+        st.caption(f"Latest rerun: {latest['seconds'] * 1000:.1f} ms")
+        st.text("\n".join(f"{'  ' * depth}{name}: {seconds * 1000:.1f} ms" for name, depth, seconds in latest["spans"]))
+
+        # Memory held by the dataset and each shared index or aggregate
+        cache_stats = shared_cache.stats()
+        st.caption(f"Shared cache: {cache_stats['bytes'] / 2 ** 20:.1f} of {cache_stats['max_bytes'] / 2 ** 20:.0f} MB, "
+                   f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions")
+        st.dataframe(shared_cache.report(), use_container_width=True, hide_index=True)
+
 def main():
     """
     Main function for interactive Streamlit dashboard.
 
-    Reads data, allows user to select time window, media buyer, and campaign.
-    Displays various metrics based on user selections using Plotly charts.
-    """
-    # Read csv data file
-    df = read_data("input_data/data_year2023.csv")
-
-    # Create a copy of the df
-    preset_df = df.copy()
-    # Get the most recent date from the DataFrame using the max_date function
-    most_recent_date = max_date(df)
-
-    # Use Streamlit to create a radio button for selecting a time window
-    # and three columns for organizing input elements
-    with tab1:
-        # Create a radio button to select a time window
-        timelines = st.radio(label="Select a Time Window", options=["7 Days", "14 Days", "Lifetime"], horizontal=True)
-        
-        # Split the layout into three columns
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            # If the selected time window is "7 Days"
-            if timelines == "7 Days":
-                # Create a text input for the start date
-                end_date_main = st.date_input("Start Date", most_recent_date)
-                
-                # Calculate the starting date by rolling back 7 days from the most recent date
-                starting = roll_back_days(most_recent_date, 7)
-                
-                # Create a text input for the end date
-                start_date_main = st.date_input("End Date", starting)
-                
-            # If the selected time window is "14 Days"
-            elif timelines == "14 Days":
-                # Create a text input for the start date
-                end_date_main = st.date_input("Start Date", most_recent_date)
-                
-                # Calculate the starting date by rolling back 14 days from the most recent date
-                starting = roll_back_days(most_recent_date, 14)
-                
-                # Create a text input for the end date
-                start_date_main = st.date_input("End Date", starting)
-
-            # If the selected time window is "Lifetime"
-            else:
-                # Create a text input for the start date
-                end_date_main = st.date_input("Start Date", most_recent_date)
-                
-                # Set the starting date as the minimum date in the DataFrame's 'ACTIVITY_DATE' column
-                starting = df['ACTIVITY_DATE'].min()
-                
-                # Create a text input for the end date
-                start_date_main = st.date_input("End Date", starting)
-
-            # Filter the DataFrame to include only rows within the selected time window
-            df = df.loc[(df['ACTIVITY_DATE'] >= starting) & (df['ACTIVITY_DATE'] <= most_recent_date)]
-
-            # if end_date_main and start_date_main:
-            #     df = df.loc[(df['ACTIVITY_DATE'] >= start_date_main) & (df['ACTIVITY_DATE'] <= end_date_main)]
-
-        # Within the second column
-        with col2:
-            # Create a selectbox for choosing a media buyer
-            media_buyer = st.selectbox(
-                'Select a media buyer',
-                df["MEDIA_BUYER"].unique().tolist()
-            )
-            
-            # Filter the DataFrame to include only rows where 'MEDIA_BUYER' matches the selected media buyer
-            df = df[df['MEDIA_BUYER'] == media_buyer]
-
-        # Within the third column
-        with col3:
-            # Create a number input for specifying the number of active days
-            active_days = st.number_input('Active within (days)', min_value=1, step=1, value=15)
-        if active_days:
-            with col2:
-                end_date = datetime.today()
-                start_date = roll_back_days(end_date,  active_days)
-                df = df[df['ACTIVITY_DATE'].between(start_date, end_date)]
-                campaign = st.selectbox(
-                    'Select a campaign',
-                    df['CAMPAIGN'].unique().tolist()
-                )
-                df = df[df['CAMPAIGN'] == campaign]
+    Renders only the selected view, so the pipelines of the other views do not run;
+    within a view, cached computations rerun only when their own inputs change.
+    """
+    # Time this rerun's stages while the performance panel is open or timings are exported
+    show_performance = st.sidebar.checkbox("Show performance", help="Time each rerun and show the last reruns' stages.")
+    recorder.start_rerun(show_performance)
+
+    # Ingest any newly appended rows
+    with span("refresh_data"):
+        data_version = refresh_data(DATA_PATH)
+
+    # Select the application screen to render
+    view = st.radio(label="Select a view", options=VIEWS, horizontal=True, label_visibility="collapsed")
+
+    with span(f"render {view}"):
+        if view == "Campaign Stats":
+            render_campaign_stats(data_version)
+        elif view == "Leaderboard":
+            render_leaderboard(data_version)
         else:
-            with col2:
-                # Create a selectbox for choosing a campaign
-                campaign = st.selectbox(
-                        'Select a campaign',
-                        df["CAMPAIGN"].unique().tolist()
-                    )
-                df = df[df['CAMPAIGN'] == campaign]
-
-        # Calculate the sum of daily return for each activity date
-        daily_return = pd.DataFrame(df.groupby("ACTIVITY_DATE")["DAILY_RETURN"].sum())
-        
-        # Create a line chart using Plotly Express
-        daily_return_fig = px.line(data_frame=daily_return,
-            x=daily_return.index,
-            y="DAILY_RETURN",
-            title=f"Daily Return over the last {timelines}"
-        )
-        
-        # Customize chart layout
-        daily_return_fig.update_layout(xaxis_title="Time Period", yaxis_title="Daily Return", height=600, width=800)
-        
-        # Display the chart using Streamlit
-        st.plotly_chart(daily_return_fig, use_container_width=True, theme=None)
-
-        # Calculate the sum of total return for each activity date
-        total_return = pd.DataFrame(df.groupby("ACTIVITY_DATE")["TOTAL_RETURN"].sum())
-
-        # Create a line chart using Plotly Express
-        total_return_fig = px.line(data_frame=total_return,
-            x=total_return.index,
-            y="TOTAL_RETURN",
-            title=f"Total Return over the last {timelines}"
-            )
-        
-        # Customize chart layout
-        total_return_fig.update_layout(xaxis_title="Time Period", yaxis_title="Total Return",height=600, width=800)
-
-        # Display the chart using Streamlit
-        st.plotly_chart(total_return_fig, use_container_width=True, theme=None)
-
-        # Calculate the sum of daily profit for each activity date
-        daily_profit = pd.DataFrame(df.groupby("ACTIVITY_DATE")["DAILY_PROFIT"].sum())
-
-        # Create a line chart using Plotly Express
-        daily_profit_fig = px.line(data_frame=daily_profit,
-            x=daily_profit.index,
-            y="DAILY_PROFIT",
-            title=f"Daily Profit over the last {timelines}"
-            )
-        
-        # Customize chart layout
-        daily_profit_fig.update_layout(xaxis_title="Time Period", yaxis_title="Daily Profit",height=600, width=800)
-
-        # Display the chart using Streamlit
-        st.plotly_chart(daily_profit_fig, use_container_width=True, theme=None)
-
-        # Calculate the sum of total profit for each activity date
-        total_profit = pd.DataFrame(df.groupby("ACTIVITY_DATE")["TOTAL_PROFIT"].sum())
-
-        # Create a line chart using Plotly Express
-        total_profit_fig = px.line(data_frame=total_profit,
-            x=total_profit.index,
-            y="TOTAL_PROFIT",
-            title=f"Total Profit over the last {timelines}"
-            )
-        
-        # Customize chart layout
-        total_profit_fig.update_layout(xaxis_title="Time Period", yaxis_title="Total Profit",height=600, width=800)
-
-        # Display the chart using Streamlit
-        st.plotly_chart(total_profit_fig, use_container_width=True, theme=None)
-
-        # Calculate the sum of spend for each activity date
-        df_spend = pd.DataFrame(df.groupby("ACTIVITY_DATE")["SPEND"].sum())
-
-        # Calculate the sum of revenue for each activity date
-        df_revenue = pd.DataFrame(df.groupby("ACTIVITY_DATE")["REVENUE"].sum())
-
-        # Create a line chart using Plotly Express
-        fig_spend = px.line(data_frame=df_spend,
-            x=df_spend.index,
-            y="SPEND",
-            title=f"Spend over the last {timelines}"
-            )
-        
-        # Customize chart layout
-        fig_spend.update_layout(xaxis_title="Time Period", yaxis_title="Spend",height=600, width=800)
-
-        # Display the chart using Streamlit
-        st.plotly_chart(fig_spend, use_container_width=True, theme=None)
-
-        # Create a line chart using Plotly Express
-        fig_revenue = px.line(data_frame=df_revenue,
-            x=df_revenue.index,
-            y="REVENUE",
-            title=f"Revenue over the last {timelines}"
-            )
-        
-        # Customize chart layout
-        fig_revenue.update_layout(xaxis_title="Time Period", yaxis_title="Revenue",height=600, width=800)
-
-        # Display the chart using Streamlit
-        st.plotly_chart(fig_revenue, use_container_width=True, theme=None)
-        
-        # Calculate the sum of spend per arrival for each activity date
-        df_spend_arr = pd.DataFrame(df.groupby("ACTIVITY_DATE")["SPEND_PER_ARRIVAL"].sum())
-
-        # Calculate the sum of revenue per arrival for each activity date
-        df_revenue_arr = pd.DataFrame(df.groupby("ACTIVITY_DATE")["REVENUE_PER_ARRIVAL"].sum())
-
-        # Calculate the sum of profit per arrival for each activity date
-        df_profit_arr = pd.DataFrame(df.groupby("ACTIVITY_DATE")["PROFIT_PER_ARRIVAL"].sum())
-
-        # Create a line chart using Plotly Express
-        fig_spend_arr = px.line(data_frame=df_spend_arr,
-            x=df_spend_arr.index,
-            y="SPEND_PER_ARRIVAL",
-            title=f"Spend Per Arrival over the last {timelines}"
-            )
-        
-        # Customize chart layout
-        fig_spend_arr.update_layout(xaxis_title="Time Period", yaxis_title="Spend Per Arrival",height=600, width=800)
-
-        # Display the chart using Streamlit
-        st.plotly_chart(fig_spend_arr, use_container_width=True, theme=None)
-
-        # Create a line chart using Plotly Express
-        fig_revenue_arr = px.line(data_frame=df_revenue_arr,
-            x=df_revenue_arr.index,
-            y="REVENUE_PER_ARRIVAL",
-            title=f"Revenue Per Arrival over the last {timelines}"
-            )
-        
-        # Customize chart layout
-        fig_revenue_arr.update_layout(xaxis_title="Time Period", yaxis_title="Revenue Per Arrival",height=600, width=800)
-
-        # Display the chart using Streamlit
-        st.plotly_chart(fig_revenue_arr, use_container_width=True, theme=None)
-
-        # Create a line chart using Plotly Express
-        fig_profit_arr = px.line(data_frame=df_profit_arr,
-            x=df_profit_arr.index,
-            y="PROFIT_PER_ARRIVAL",
-            title=f"Profit Per Arrival over the last {timelines}"
-            )
-        
-        # Customize chart layout
-        fig_profit_arr.update_layout(xaxis_title="Time Period", yaxis_title="Profit Per Arrival",height=600, width=800)
-
-        # Display the chart using Streamlit
-        st.plotly_chart(fig_profit_arr, use_container_width=True, theme=None)
-
-        # Calculate the sum of acceptance rate for each activity date
-        acceptance_rate = pd.DataFrame(df.groupby("ACTIVITY_DATE")["ACCEPTANCE_RATE"].sum())
-
-        # Create a line chart using Plotly Express
-        acceptance_rate_fig = px.line(data_frame=acceptance_rate,
-            x=acceptance_rate.index,
-            y="ACCEPTANCE_RATE",
-            title=f"Acceptance Rate over the last {timelines}"
-            )
-        
-        # Customize chart layout
-        acceptance_rate_fig.update_layout(xaxis_title="Time Period", yaxis_title="Acceptance Rate",height=600, width=800)
-
-        # Display the chart using Streamlit
-        st.plotly_chart(acceptance_rate_fig, use_container_width=True, theme=None)
-
-        # Create sidebar with save settings and load presets - Indent every line of code after `with st.sidebar`
-        # Display the Save Profile section in the sidebar
-        with st.sidebar:
-            # Display Current Settings
-            st.header("Current Settings")
-            st.info(f"Time window: {timelines}") 
-            st.info(f"Start Date: {str(end_date_main).split(' ')[0].replace('-', '/')}") # Format for conformity with streamlit date input
-            st.info(f"End Date: {str(start_date_main).split(' ')[0].replace('-', '/')}") # Format for conformity with streamlit date input
-            st.info(f"Media buyer: {media_buyer}")
-            st.info(f"Active within (days): {active_days}")
-            st.info(f"Campaign: {campaign}")
-
-            st.header("Save Current Settings")
-
-            # Prompt for user name
-            user_name = st.selectbox(
-                'Select a user:',
-                preset_df['MEDIA_BUYER'].unique().tolist()
-            )
-
-            # Prompt for profile name
-            profile_name = st.text_input("Enter a new profile name:")
-
-            # Create a settings dictionary
-            settings = {
-                "time_line": timelines,
-                "start_date": str(end_date_main),
-                "end_date": str(start_date_main),
-                "media_buyer": media_buyer,
-                "active_days": active_days,
-                "campaign": campaign
-            }
-            
-            # Save button to save the current settings
-            save_preset = st.button("Save Settings")
-
-            if save_preset:
-                save_profile(user_name, profile_name, settings)
-                st.success(f"Settings for {user_name} saved!")
-            
-            # Display Saved Settings
-            st.header("Load Saved Settings")
-
-            # Prompt for user to select
-            user = st.selectbox(
-                'User:',
-                preset_df['MEDIA_BUYER'].unique().tolist()
-            )
-            if user:
-                # Load profiles for the selected user
-                settings_df = load_profile(user_name=user)
-            # Prompt for profile name
-            profile_df = settings_df[settings_df["user_name"]==user]
-            settings_profile = st.selectbox(
-                'Saved settings:',
-                profile_df['profile_name'].tolist()
-            )
-            if settings_profile:
-                # Retrieve saved settings for the selected profile
-                saved_settings = settings_df[
-                    (settings_df["user_name"]==user) & (settings_df["profile_name"]==settings_profile)
-                ]['settings']
-                result_dict = saved_settings.values[0]
-
-            # Display saved settings
-            st.info(f"Time window: {result_dict['time_line']}") 
-            st.info(f"Start Date: {result_dict['start_date'].split(' ')[0].replace('-', '/')}") # Format for conformity with streamlit date input
-            st.info(f"End Date: {result_dict['end_date'].split(' ')[0].replace('-', '/')}") # Format for conformity with streamlit date input
-            st.info(f"Media buyer: {result_dict['media_buyer']}")
-            st.info(f"Active within (days): {result_dict['active_days']}")
-            st.info(f"Campaign: {result_dict['campaign']}")
-
-    with tab2:
-        # Split the layout into three columns
-        col4, col5, col6 = st.columns(3)
-        
-        # Create a radio button to select a time window
-        with col4:
-            leaderboard_timelines = st.radio(label="Select a Time Window", options=["weekly", "monthly", "yearly"], horizontal=True)
-        
-        # Create visualization options in the sidebar
-        with st.sidebar:
-            st.title("Visualize Leaderboard")
-            col7, col8 = st.columns(2)
-            
-            # Visualization checkboxes
-            with col7:
-                pie_chart = st.checkbox("Pie chart")
-                vertical_bar_chart = st.checkbox("Vertical Bar chart")
-            with col8:
-                line_chart = st.checkbox("Line chart")
-                horizontal_bar_chart = st.checkbox("Horizontal Bar chart")
-
-        # Read and preprocess data
-        leaderboard_df = process_activity_date_columns(pd.read_csv("input_data/data_year2023.csv"))
-        
-        # Get end date from user input
-        with col4:
-            end_date_leaderboard = st.date_input("End date", leaderboard_df["ACTIVITY_DATE"].max())
-
-        # Generate leaderboard based on selected time window
-        leaderboard = generate_leaderboard(leaderboard_df, str(end_date_leaderboard), leaderboard_timelines)
-
-        # Toggle to show/hide the leaderboard
-        show_leaderboard = st.toggle('Show Leaderboard')
-        
-        # Display the leaderboard if toggled on
-        if show_leaderboard:
-            st.dataframe(leaderboard,
-                        column_order=("RANKING", "NAME", "DOLLAR_AMOUNT", "PERCENTAGE"),
-                        height=200,
-                        use_container_width=False,
-                        hide_index=True
-                        )
-        # Plotly Charts based on user selections
-        if pie_chart:
-            # Create a Pie Chart using the 'Percentage' column
-            fig_pie_percentage = px.pie(leaderboard, names='NAME', values='DOLLAR_AMOUNT', title='Pie Chart (Percentage)')
-            fig_pie_percentage.update_layout(height=600, width=800)
-            st.plotly_chart(fig_pie_percentage, use_container_width=True, theme=None)
-
-        if vertical_bar_chart:
-            # Create a Vertical Bar Chart
-            fig_vertical_bar = px.bar(leaderboard, x='NAME', y='DOLLAR_AMOUNT', title='Vertical Bar Chart')
-            fig_vertical_bar.update_layout(xaxis_title="Name", yaxis_title="Amount [USD]",height=600, width=800)
-            st.plotly_chart(fig_vertical_bar, use_container_width=True, theme=None)
-        
-        if horizontal_bar_chart:
-            # Create a Horizontal Bar Chart
-            fig_horizontal_bar = px.bar(leaderboard.sort_values(by="DOLLAR_AMOUNT",ascending=True), 
-                                        x='DOLLAR_AMOUNT', y='NAME', orientation='h', title='Horizontal Bar Chart')
-            fig_horizontal_bar.update_layout(xaxis_title="Amount [USD]", yaxis_title="Name",height=600, width=800)
-            st.plotly_chart(fig_horizontal_bar, use_container_width=True, theme=None)
-
-        if line_chart:
-            # Create a Line Chart
-            fig_line = px.line(leaderboard, x='NAME', y='PERCENTAGE', title='Line Chart')
-            fig_line.update_layout(xaxis_title="Name", yaxis_title="Percentage",height=600, width=800)
-            st.plotly_chart(fig_line, use_container_width=True, theme=None)
-
-    with tab3:
-        # Set the title of the Streamlit app
-        st.title("Image Search and Download")
-
-        # Take user input for image search query
-        query = st.text_input("Enter your image search query:")
-
-        # Check if the "Search" button is clicked
-        if st.button("Search"):
-            # Prepare parameters for Google Images Search
-            search_params = {
-                'q': query,
-                'num': 5,  # Number of images to retrieve
-                'safe': 'off',  # Disable safe search
-            }
-
-            # Perform Google Images Search
-            gis.search(search_params=search_params)
-
-            # Display images in the search results
-            for image in gis.results():
-                # Get the URL and description of the image
-                image_url, image_description = display_image(image)
-
-                # Display the image with its caption
-                st.image(image_url, caption=image_description, use_column_width=True)
-
-                # Check if the "Download" button is clicked for the current image
-                if st.button("Download"):
-                    # Download the image
-                    img = download_image(image)
-
-                    # Prompt the user to choose where to save the image
-                    file_path = st.file_uploader("Choose where to save the image:", type="png")
-
-                    # Check if the user has chosen a file path
-                    if file_path:
-                        # Save the image to the specified file path
-                        img.save(file_path, "PNG")
-                        st.success(f"Image saved to {file_path}")
+            render_image_search()
+
+    # Keep this session's reruns; the recorder only accumulates the process totals it exports
+    history = st.session_state.setdefault("performance_history", deque(maxlen=HISTORY_SIZE))
+    rerun = recorder.end_rerun()
+    if rerun is not None:
+        history.append(rerun)
+    if show_performance:
+        render_performance_panel(history)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,89 @@
+"""
+Report how long importing the dashboard takes, using Python's -X importtime.
+
+Usage (from the 'campaign_analytics' folder):
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module features.dataset --top 30
+    python benchmarks/import_time.py --budget-ms 1000
+
+The module is imported in a fresh interpreter, --repeat times, and the fastest run is reported:
+the total import time, the slowest imports by cumulative time, and which of the heavy optional
+dependencies were loaded. Importing 'app' runs its module level in Streamlit's bare mode, from a
+scratch folder so the profile database in the repo is not touched. The script exits with status 1
+when a heavy dependency was loaded eagerly or the total exceeds --budget-ms.
+"""
+import os
+import sys
+import argparse
+import tempfile
+import subprocess
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencies that only some views need, and that must not be imported at startup
+# (PIL is left out: Streamlit imports it itself)
+LAZY_MODULES = ["google_images_search", "plotly.express", "requests"]
+
+def run_importtime(module, scratch):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Parameters:
+    - module (str): The module to import.
+    - scratch (str): The working directory of the interpreter.
+
+    Returns:
+    - tuple: The import rows as (self_us, cumulative_us, depth, name), in import order, and
+      the names of the LAZY_MODULES loaded by the import.
+    """
+    code = (
+        f"import sys, {module}\n"
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+    env = dict(os.environ, PYTHONPATH=APP_DIR)
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=scratch, env=env,
+                               capture_output=True, text=True, check=True)
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+
+    loaded = completed.stdout.strip().splitlines()[-1] if completed.stdout.strip() else ""
+    return rows, [name for name in loaded.split(",") if name]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app", help="Module to import.")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters to run; the fastest is reported.")
+    parser.add_argument("--top", type=int, default=20, help="Slowest imports to list.")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail when the total import time exceeds this.")
+    args = parser.parse_args()
+
+    # The profile store opens 'database/user_presets.db' relative to the working directory
+    scratch = tempfile.mkdtemp()
+    os.makedirs(os.path.join(scratch, "database"))
+
+    runs = [run_importtime(args.module, scratch) for _ in range(args.repeat)]
+    rows, loaded = min(runs, key=lambda run: sum(row[0] for row in run[0]))
+    total_ms = sum(row[0] for row in rows) / 1000
+
+    print(f"Importing {args.module}: {total_ms:.1f} ms over {len(rows)} modules (fastest of {args.repeat})")
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for self_us, cumulative_us, depth, name in sorted(rows, key=lambda row: -row[1])[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {'  ' * depth}{name}")
+
+    status = 0
+    if loaded:
+        print(f"Loaded eagerly, but should load on first use: {', '.join(loaded)}")
+        status = 1
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"Import time {total_ms:.1f} ms exceeds the budget of {args.budget_ms:.0f} ms")
+        status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
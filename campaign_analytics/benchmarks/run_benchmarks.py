@@ -0,0 +1,254 @@
+"""
+Headless benchmarks of the dashboard's data paths, without Streamlit.
+
+Usage (from the 'campaign_analytics' folder):
+    python benchmarks/run_benchmarks.py --rows 100 100000 1000000
+    python benchmarks/run_benchmarks.py --rows 100000 --save-baseline
+    python benchmarks/run_benchmarks.py --rows 100000 --baseline benchmarks/baseline.json
+
+Each stage is timed (best of --repeat runs) and then run once more under tracemalloc to record
+its peak memory. tracemalloc sees Python and NumPy allocations but not Arrow's own memory pool,
+so the Parquet stages under-report their peak. Results are compared against a stored baseline;
+the script exits with status 1 when a stage is slower or larger than the baseline by more than
+--tolerance. The parallel aggregation is checked against the serial one before it is timed, and
+the script stops with an AssertionError if they differ in any way. The same goes for the dropdown
+lists of the date index and the campaign activity index.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import pandas as pd
+from benchmarks.synthetic_data import write_campaign_csv
+from features.activity_index import CampaignActivityIndex
+from features.aggregation import aggregate_metrics, DEFAULT_METRICS
+from features.dataset import ingest_csv, load_dataset
+from features.date_index import DateIndex
+from features.leaderboard import process_activity_date_columns, generate_leaderboard, LeaderboardIndex, frequency_window
+from features.parallel import configure_parallelism, parallel_aggregate_metrics
+from features.rollup import ROLLUP_LEVELS, build_rollups, select_rollup
+
+DEFAULT_BASELINE = os.path.join(APP_DIR, "benchmarks", "baseline.json")
+
+def measure(fn, repeat, setup=None):
+    """
+    Time a stage and record its peak traced memory.
+
+    Parameters:
+    - fn (callable): The stage to run, without arguments.
+    - repeat (int): The number of timed runs; the fastest is reported.
+    - setup (callable, optional): Run untimed before every run of the stage, without arguments.
+
+    Returns:
+    - dict: The stage's 'seconds' and 'peak_mb'.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"seconds": min(timings), "peak_mb": peak / 2 ** 20}
+
+def campaign_stages(csv_path):
+    """
+    Build the campaign data stages for one CSV file.
+
+    Parameters:
+    - csv_path (str): The path to the campaign CSV file.
+
+    Returns:
+    - list: (name, callable) pairs, in run order.
+    """
+    store_path = ingest_csv(csv_path)
+    df = load_dataset(csv_path)
+    rollups = build_rollups(df)
+    buyer_rollup = select_rollup(rollups, ["ACTIVITY_DATE", "MEDIA_BUYER"])
+    end_date = df["ACTIVITY_DATE"].max().strftime("%Y-%m-%d")
+    leaderboard_index = LeaderboardIndex(buyer_rollup)
+    cube = select_rollup(rollups, ["ACTIVITY_DATE", "MEDIA_BUYER", "CAMPAIGN"])
+    date_index = DateIndex(cube, keys=[("MEDIA_BUYER",)])
+    activity_index = CampaignActivityIndex(cube)
+    active_start = df["ACTIVITY_DATE"].max() - pd.Timedelta(days=15)
+
+    def read_csv_raw():
+        raw = pd.read_csv(csv_path)
+        raw["ACTIVITY_DATE"] = pd.to_datetime(raw["ACTIVITY_DATE"], format="%Y-%m-%d")
+
+    def groupby_per_metric():
+        for metric in DEFAULT_METRICS:
+            pd.DataFrame(df.groupby("ACTIVITY_DATE")[metric].sum())
+
+    # The partitioned aggregation must match the serial one exactly, not just closely, whichever
+    # key it partitions on; two workers are passed so the pool runs even where --workers is 1
+    cube_keys, buyer_keys = list(ROLLUP_LEVELS[0]), list(ROLLUP_LEVELS[1])
+    for keys, partition_by in [(cube_keys, None), (cube_keys, "ACTIVITY_DATE"), (buyer_keys, None), (buyer_keys, "ACTIVITY_DATE")]:
+        pd.testing.assert_frame_equal(aggregate_metrics(df, by=keys),
+                                      parallel_aggregate_metrics(df, by=keys, partition_by=partition_by, workers=2, min_rows=0),
+                                      check_exact=True)
+
+    # The dropdowns of the Campaign Stats view, for every media buyer, from the date index and from the activity index
+    def dropdowns_date_index():
+        return [(buyer, date_index.lookup({"MEDIA_BUYER": buyer}, active_start)["CAMPAIGN"].unique().tolist())
+                for buyer in date_index.window(active_start)["MEDIA_BUYER"].unique().tolist()]
+
+    def dropdowns_activity_index():
+        return [(buyer, activity_index.campaigns(buyer, active_start)) for buyer in activity_index.buyers(active_start)]
+
+    # Both indexes must list the same buyers and campaigns in the same order
+    assert dropdowns_date_index() == dropdowns_activity_index()
+
+    def leaderboards_raw():
+        for frequency in ("weekly", "monthly", "yearly"):
+            generate_leaderboard(df, end_date, frequency)
+
+    return [
+        ("read_csv_raw", read_csv_raw),
+        ("ingest_csv", lambda: ingest_csv(csv_path, store_path)),
+        ("load_dataset", lambda: load_dataset(csv_path)),
+        ("process_activity_date_columns", lambda: process_activity_date_columns(df.copy())),
+        ("groupby_per_metric", groupby_per_metric),
+        ("aggregate_metrics", lambda: aggregate_metrics(df)),
+        ("aggregate_cube_serial", lambda: aggregate_metrics(df, by=cube_keys)),
+        ("aggregate_cube_parallel", lambda: parallel_aggregate_metrics(df, by=cube_keys, min_rows=0)),
+        ("build_rollups", lambda: build_rollups(df)),
+        ("generate_leaderboard", leaderboards_raw),
+        ("leaderboard_index_build", lambda: LeaderboardIndex(buyer_rollup)),
+        ("leaderboard_index_query", lambda: leaderboard_index.leaderboards(
+            [frequency_window(end_date, frequency) for frequency in ("weekly", "monthly", "yearly")])),
+        ("activity_index_build", lambda: CampaignActivityIndex(cube)),
+        ("dropdowns_date_index", dropdowns_date_index),
+        ("dropdowns_activity_index", dropdowns_activity_index),
+    ]
+
+def profile_stages(calls):
+    """
+    Build the profile database stages against a scratch database.
+
+    Parameters:
+    - calls (int): The number of save or load calls per stage.
+
+    Returns:
+    - list: (name, callable, setup) triples, in run order; setup is None or runs untimed before the stage.
+    """
+    # The profile store opens 'database/user_presets.db' relative to the working directory
+    scratch = tempfile.mkdtemp()
+    os.makedirs(os.path.join(scratch, "database"))
+    os.chdir(scratch)
+    from features import database
+
+    settings = {"time_line": "7 Days", "media_buyer": "Buyer_000", "active_days": 15}
+
+    def save_profiles():
+        for i in range(calls):
+            database.save_profile(f"Buyer_{i % 10:03d}", f"profile_{i}", settings)
+
+    def load_profiles_uncached():
+        for i in range(calls):
+            database.profile_cache.invalidate()
+            database.load_profile(f"Buyer_{i % 10:03d}")
+
+    def load_profiles_cached():
+        for i in range(calls):
+            database.load_profile(f"Buyer_{i % 10:03d}")
+
+    # Every user is loaded before the cached stage is timed, so it times cache hits only
+    def warm_profile_cache():
+        for i in range(min(calls, 10)):
+            database.load_profile(f"Buyer_{i:03d}")
+
+    return [
+        ("save_profile", save_profiles, None),
+        ("load_profile_uncached", load_profiles_uncached, None),
+        ("load_profile_cached", load_profiles_cached, warm_profile_cache),
+    ]
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results against a baseline.
+
+    Parameters:
+    - results (dict): The measured results, keyed by 'stage@rows'.
+    - baseline (dict): The baseline results, in the same shape.
+    - tolerance (float): The allowed relative increase, e.g. 0.2 for 20%.
+
+    Returns:
+    - list: Descriptions of every regression found.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for measure_name in ("seconds", "peak_mb"):
+            before, after = baseline[key][measure_name], result[measure_name]
+            if after > before * (1 + tolerance) and after - before > 1e-3:
+                regressions.append(f"{key} {measure_name}: {before:.4f} -> {after:.4f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 10_000, 100_000], help="Dataset sizes to benchmark.")
+    parser.add_argument("--buyers", type=int, default=10, help="Distinct media buyers in the synthetic data.")
+    parser.add_argument("--campaigns", type=int, default=200, help="Distinct campaigns in the synthetic data.")
+    parser.add_argument("--days", type=int, default=365, help="Days spanned by the synthetic data.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage.")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for the parallel aggregation stages.")
+    parser.add_argument("--profile-calls", type=int, default=100, help="Calls per profile database stage.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression.")
+    args = parser.parse_args()
+
+    if args.workers is not None:
+        configure_parallelism(workers=args.workers)
+
+    results = {}
+    data_dir = tempfile.mkdtemp()
+    for rows in args.rows:
+        csv_path = write_campaign_csv(os.path.join(data_dir, f"campaigns_{rows}.csv"), rows,
+                                      buyers=args.buyers, campaigns=args.campaigns, days=args.days)
+        for name, fn in campaign_stages(csv_path):
+            results[f"{name}@{rows}"] = measure(fn, args.repeat)
+
+    for name, fn, setup in profile_stages(args.profile_calls):
+        results[f"{name}@{args.profile_calls}"] = measure(fn, 1, setup)
+
+    # Report every stage
+    print(f"{'stage':<45}{'seconds':>12}{'peak MB':>12}")
+    for key, result in results.items():
+        print(f"{key:<45}{result['seconds']:>12.4f}{result['peak_mb']:>12.2f}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against the baseline:")
+            print("\n".join(regressions))
+            return 1
+        print("No regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+def generate_campaign_data(rows, buyers=10, campaigns=200, days=365, start_date="2023-01-01", seed=0):
+    """
+    Generate synthetic campaign data with the columns of 'data_for_dash.csv'.
+
+    Each campaign belongs to one media buyer and runs over a stretch of the period, like the real
+    export. The dates stay within the period however many rows are generated, so large datasets
+    have many rows per date and campaign rather than an ever longer span of dates.
+
+    Parameters:
+    - rows (int): The number of rows to generate.
+    - buyers (int, optional): The number of distinct media buyers.
+    - campaigns (int, optional): The number of distinct campaigns.
+    - days (int, optional): The number of days the activity dates span.
+    - start_date (str, optional): The first activity date in 'YYYY-MM-DD' format.
+    - seed (int, optional): The random seed.
+
+    Returns:
+    - pd.DataFrame: The generated data, sorted by campaign and date.
+    """
+    rng = np.random.default_rng(seed)
+    campaigns = max(1, min(campaigns, rows))
+
+    # Spread the rows over the campaigns; each campaign's rows fall on days of its own stretch of the period
+    days = max(1, days)
+    campaign_codes = rng.integers(0, campaigns, rows)
+    campaign_start = rng.integers(0, days, campaigns)
+    campaign_days = rng.integers(1, days - campaign_start + 1)
+    day = campaign_start[campaign_codes] + (rng.random(rows) * campaign_days[campaign_codes]).astype(int)
+    order = np.lexsort((day, campaign_codes))
+    campaign_codes, day = campaign_codes[order], day[order]
+    dates = pd.Timestamp(start_date) + pd.to_timedelta(day, unit="D")
+
+    # Every campaign is run by one media buyer
+    buyer_names = np.array([f"Buyer_{i:03d}" for i in range(buyers)])
+    campaign_names = np.array([f"CMP_{i:06d}" for i in range(campaigns)])
+    campaign_buyer = rng.integers(0, buyers, campaigns)
+
+    lander_arrivals = rng.integers(1_000, 20_000, rows)
+    serp_arrivals = (lander_arrivals * rng.uniform(0.2, 0.4, rows)).astype(int) + 1
+    ad_clicks = (serp_arrivals * rng.uniform(0.7, 1.1, rows)).astype(int) + 1
+    accepted_clicks = (ad_clicks * rng.uniform(0.4, 0.7, rows)).astype(int)
+    spend = lander_arrivals * rng.uniform(0.004, 0.01, rows)
+    revenue = spend * rng.uniform(0.5, 1.5, rows)
+    daily_profit = revenue - spend
+
+    df = pd.DataFrame({
+        "ACTIVITY_DATE": dates.strftime("%Y-%m-%d"),
+        "MEDIA_BUYER": buyer_names[campaign_buyer[campaign_codes]],
+        "CAMPAIGN": campaign_names[campaign_codes],
+        "SPEND": spend,
+        "REVENUE": revenue,
+        "DAILY_PROFIT": daily_profit,
+        "TOTAL_PROFIT": pd.Series(daily_profit).groupby(campaign_codes).cumsum().to_numpy(),
+        "DAILY_RETURN": daily_profit / spend,
+        "TOTAL_RETURN": None,
+        "LANDER_ARRIVALS": lander_arrivals,
+        "SERP_ARRIVALS": serp_arrivals,
+        "AD_CLICKS": ad_clicks,
+        "ACCEPTED_CLICKS": accepted_clicks.astype(float),
+        "ACCEPTANCE_RATE": accepted_clicks / ad_clicks,
+        "SPEND_PER_ARRIVAL": spend / lander_arrivals,
+        "REVENUE_PER_ARRIVAL": revenue / lander_arrivals,
+        "PROFIT_PER_ARRIVAL": daily_profit / lander_arrivals,
+    })
+    df["TOTAL_RETURN"] = df["TOTAL_PROFIT"] / pd.Series(spend).groupby(campaign_codes).cumsum().to_numpy()
+
+    return df
+
+def write_campaign_csv(path, rows, **kwargs):
+    """
+    Generate synthetic campaign data and write it as a CSV file.
+
+    Parameters:
+    - path (str): The path of the CSV file to write.
+    - rows (int): The number of rows to generate.
+    - **kwargs: Passed on to generate_campaign_data.
+
+    Returns:
+    - str: The path of the written file.
+    """
+    generate_campaign_data(rows, **kwargs).to_csv(path, index=False)
+    return path
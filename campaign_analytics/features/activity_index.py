@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+from features.instrumentation import timed
+
+class _ActiveDays:
+    """
+    The sorted distinct active days of numbered groups, stored as one integer key per day: the
+    group's number times the number of days covered, plus the day's offset.
+    """
+
+    def __init__(self, groups, days, span, count):
+        self.span = span
+        self.keys = np.unique(groups * span + days)
+        key_groups = self.keys // span
+        starts = np.searchsorted(key_groups, np.arange(count), side="left")
+        stops = np.searchsorted(key_groups, np.arange(count), side="right")
+        self.counts = stops - starts
+        self.first_days = self.keys[np.minimum(starts, len(self.keys) - 1)] % span
+        self.last_days = self.keys[np.maximum(stops - 1, 0)] % span
+
+    def active(self, groups, low_day, high_day):
+        """Select the groups with a day in the inclusive window, and their first day within it."""
+        # Only groups whose first and last days overlap the window can have a day within it
+        groups = groups[(self.first_days[groups] <= high_day) & (self.last_days[groups] >= low_day)]
+        first_days = self.first_days[groups]
+
+        # Groups that started before the window may have no day within it; search their days
+        earlier = np.flatnonzero(first_days < low_day)
+        low = np.searchsorted(self.keys, groups[earlier] * self.span + low_day, side="left")
+        high = np.searchsorted(self.keys, groups[earlier] * self.span + high_day, side="right")
+        first_days[earlier] = np.where(high > low, self.keys[np.minimum(low, len(self.keys) - 1)] % self.span, -1)
+
+        active = first_days >= 0
+        return groups[active], first_days[active]
+
+class CampaignActivityIndex:
+    """
+    The active days of every media buyer and (media buyer, campaign) pair, answering which buyers
+    and campaigns were active within a date window by binary search instead of scanning rows.
+
+    Attributes:
+        pairs (pd.DataFrame): One row per (MEDIA_BUYER, CAMPAIGN) pair, indexed by the pair and
+            ordered by media buyer then campaign, with its 'FIRST_DATE', 'LAST_DATE' and 'ACTIVE_DAYS'.
+        min_date (pd.Timestamp): The earliest activity date, or None for empty data.
+        max_date (pd.Timestamp): The most recent activity date, or None for empty data.
+
+    Note:
+        The active days of each pair, and of each buyer, are one contiguous run of sorted integer
+        keys, so checking a window for any number of them takes two vectorized binary searches.
+        Pairs and buyers whose first and last active days settle the check are not searched.
+    """
+
+    def __init__(self, df):
+        """
+        Parameters:
+        - df (pd.DataFrame): Campaign rows or rollups with 'ACTIVITY_DATE', 'MEDIA_BUYER' and
+          'CAMPAIGN' columns, such as the (date, buyer, campaign) rollup.
+        """
+        grouped = df.groupby(["MEDIA_BUYER", "CAMPAIGN"], observed=True, sort=True)
+        pair_rows = grouped.ngroup().to_numpy(dtype=np.int64)
+        labels = grouped.size().index
+        self._buyer_codes, buyers = pd.factorize(labels.get_level_values("MEDIA_BUYER"))
+        self._buyer_labels = np.asarray(buyers)
+        self._campaign_labels = np.asarray(labels.get_level_values("CAMPAIGN"))
+
+        days = df["ACTIVITY_DATE"].to_numpy(dtype="datetime64[D]").astype(np.int64)
+        self._first_day = int(days.min()) if len(days) else 0
+        self._span = (int(days.max()) - self._first_day + 1) if len(days) else 1
+        days = days - self._first_day
+
+        self._pair_days = _ActiveDays(pair_rows, days, self._span, len(labels))
+        self._buyer_days = _ActiveDays(self._buyer_codes[pair_rows], days, self._span, len(buyers))
+
+        self.pairs = pd.DataFrame({
+            "FIRST_DATE": self._to_dates(self._pair_days.first_days),
+            "LAST_DATE": self._to_dates(self._pair_days.last_days),
+            "ACTIVE_DAYS": self._pair_days.counts,
+        }, index=labels)
+        self.min_date = self.pairs["FIRST_DATE"].min() if len(self.pairs) else None
+        self.max_date = self.pairs["LAST_DATE"].max() if len(self.pairs) else None
+
+        # The rows of 'pairs' belonging to each media buyer
+        self._buyer_rows = self.pairs.groupby(level="MEDIA_BUYER", observed=True, sort=False).indices
+
+    def __len__(self):
+        return len(self.pairs)
+
+    @timed("CampaignActivityIndex.buyers")
+    def buyers(self, start=None, end=None):
+        """
+        List the media buyers with a campaign active within an inclusive date window.
+
+        Parameters:
+        - start (datetime or str, optional): The first date of the window. Unbounded if not provided.
+        - end (datetime or str, optional): The last date of the window. Unbounded if not provided.
+
+        Returns:
+        - list: The media buyers, in order of first activity within the window.
+        """
+        codes, first_days = self._active(self._buyer_days, np.arange(len(self._buyer_labels)), start, end)
+        return self._buyer_labels[codes[np.lexsort((codes, first_days))]].tolist()
+
+    @timed("CampaignActivityIndex.campaigns")
+    def campaigns(self, media_buyer, start=None, end=None):
+        """
+        List the campaigns of a media buyer active within an inclusive date window.
+
+        Parameters:
+        - media_buyer (str): The media buyer.
+        - start (datetime or str, optional): The first date of the window. Unbounded if not provided.
+        - end (datetime or str, optional): The last date of the window. Unbounded if not provided.
+
+        Returns:
+        - list: The campaigns, in order of first activity within the window.
+        """
+        rows = self._buyer_rows.get(media_buyer, np.empty(0, dtype=np.intp))
+        rows, first_days = self._active(self._pair_days, rows, start, end)
+        return self._campaign_labels[rows[np.lexsort((rows, first_days))]].tolist()
+
+    def _active(self, active_days, groups, start, end):
+        """Select the buyers or pairs with a day in the window, and their first day within it."""
+        low_day = 0 if start is None else self._day(pd.Timestamp(start).ceil("D"))
+        high_day = self._span - 1 if end is None else self._day(pd.Timestamp(end).floor("D"))
+        low_day, high_day = max(low_day, 0), min(high_day, self._span - 1)
+        if low_day > high_day or not len(active_days.keys):
+            return groups[:0], groups[:0]
+        return active_days.active(groups, low_day, high_day)
+
+    def _day(self, timestamp):
+        """Convert a timestamp to a day offset from the first activity date."""
+        return int(timestamp.to_datetime64().astype("datetime64[D]").astype(np.int64)) - self._first_day
+
+    def _to_dates(self, day_offsets):
+        """Convert day offsets from the first activity date to timestamps."""
+        return (day_offsets + self._first_day).astype("datetime64[D]").astype("datetime64[ns]")
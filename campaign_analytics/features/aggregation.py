@@ -0,0 +1,34 @@
+from features.instrumentation import timed
+
+# Metrics summed when no metric columns are given
+DEFAULT_METRICS = [
+    "DAILY_RETURN",
+    "TOTAL_RETURN",
+    "DAILY_PROFIT",
+    "TOTAL_PROFIT",
+    "SPEND",
+    "REVENUE",
+    "SPEND_PER_ARRIVAL",
+    "REVENUE_PER_ARRIVAL",
+    "PROFIT_PER_ARRIVAL",
+    "ACCEPTANCE_RATE",
+]
+
+@timed("aggregate_metrics")
+def aggregate_metrics(df, metrics=None, by="ACTIVITY_DATE"):
+    """
+    Sum several metrics for each group in a single grouped pass.
+
+    Parameters:
+    - df (pd.DataFrame): The input DataFrame containing the data.
+    - metrics (list, optional): The metric columns to sum. Defaults to DEFAULT_METRICS.
+    - by (str or list, optional): The column(s) to group by. Defaults to 'ACTIVITY_DATE'.
+
+    Returns:
+    - pd.DataFrame: A wide DataFrame indexed by the group key(s) with one column per metric.
+    """
+    if metrics is None:
+        metrics = DEFAULT_METRICS
+
+    # Group once and sum every metric column together
+    return df.groupby(by, observed=True)[list(metrics)].sum()
@@ -1,8 +1,15 @@
+import time
+import threading
 import pandas as pd
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import timedelta, datetime
-from sqlalchemy import create_engine, Column, Integer, String, JSON, DateTime
+from sqlalchemy import create_engine, event, delete, func, inspect, select, Column, Integer, String, JSON, DateTime, Index
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from features.instrumentation import timed
 
 Base = declarative_base()
 
@@ -19,9 +26,13 @@ class Profile(Base):
 
     Note:
         The 'timestamp_UTC' field is automatically populated with the current UTC time when a new profile is created.
+        Each (user_name, profile_name) pair is unique; saving an existing pair updates it.
     """
 
     __tablename__ = 'profiles'
+    __table_args__ = (
+        Index('ix_profiles_user_name_profile_name', 'user_name', 'profile_name', unique=True),
+    )
 
     id = Column(Integer, unique=True, primary_key=True)
     user_name = Column(String)
@@ -29,19 +40,241 @@ class Profile(Base):
     settings = Column(JSON)
     timestamp_UTC = Column(DateTime, default=datetime.utcnow)  # Default to the current UTC time
 
-# Create an SQLAlchemy engine with a SQLite database file named 'user_presets.db' in the 'database' folder
-engine = create_engine('sqlite:///database/user_presets.db')
+# Seconds a connection waits for a lock held by another writer before failing
+BUSY_TIMEOUT_SECONDS = 30
+
+# Create an SQLAlchemy engine with a SQLite database file named 'user_presets.db' in the 'database' folder,
+# sharing a bounded pool of connections between the app's sessions
+engine = create_engine(
+    'sqlite:///database/user_presets.db',
+    connect_args={'timeout': BUSY_TIMEOUT_SECONDS, 'check_same_thread': False},
+    poolclass=QueuePool,
+    pool_size=5,
+    max_overflow=10,
+    pool_timeout=BUSY_TIMEOUT_SECONDS,
+    pool_pre_ping=True,
+)
+
+@event.listens_for(engine, "connect")
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """
+    Configure each new SQLite connection for concurrent readers and writers.
+
+    Args:
+        dbapi_connection: The raw DBAPI connection.
+        connection_record: The pool's record of the connection.
+
+    Returns:
+        None
+    """
+    cursor = dbapi_connection.cursor()
+    # Write-ahead logging lets readers proceed while a write is in progress
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_SECONDS * 1000}")
+    cursor.close()
+
+def migrate_profiles_table():
+    """
+    Bring an existing 'profiles' table up to the current model.
+
+    When the unique composite index is missing, removes duplicate (user_name, profile_name) rows,
+    keeping the most recently saved one, then creates the index. Once the index exists only the
+    schema is read, so no write lock is taken.
+
+    Returns:
+        None
+    """
+    existing = {index["name"] for index in inspect(engine).get_indexes(Profile.__tablename__)}
+    if all(index.name in existing for index in Profile.__table__.indexes):
+        return
+
+    with engine.begin() as connection:
+        latest_ids = select(func.max(Profile.id)).group_by(Profile.user_name, Profile.profile_name)
+        connection.execute(delete(Profile).where(Profile.id.not_in(latest_ids)))
+        for index in Profile.__table__.indexes:
+            index.create(bind=connection, checkfirst=True)
 
 # Create the database tables defined in the Base class (assuming Base is a declarative_base())
 # and bind them to the engine
 Base.metadata.create_all(bind=engine)
+migrate_profiles_table()
 
 # Create a Session class bound to the engine
 Session = sessionmaker(bind=engine)
 
+@contextmanager
+def session_scope():
+    """
+    Provide a session that commits on success, rolls back on error and is always closed.
+
+    Yields:
+        Session: A database session.
+    """
+    session = Session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+# Columns of the DataFrames returned by load_profile
+PROFILE_COLUMNS = ['user_name', 'profile_name', 'settings', 'timestamp_UTC']
+
+# Seconds a user's cached profiles are served before they are read again, which bounds how long
+# profiles saved by other app processes stay unseen
+PROFILE_CACHE_TTL = 30
+
+class ProfileCache:
+    """
+    Bounded in-process LRU cache of each user's saved profiles.
+
+    Attributes:
+        max_users (int): The number of users whose profiles are kept before the least recently used is evicted.
+        ttl (float): Seconds a user's profiles are served from the cache before they expire.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that had to query the database.
+
+    Note:
+        save_profile writes through this cache and bumps the user's generation, so profiles read
+        from the database while a save of this process committed are never cached. Saves made by
+        other app processes are seen once the cached profiles expire.
+    """
+
+    def __init__(self, max_users=256, ttl=PROFILE_CACHE_TTL, clock=time.monotonic):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = OrderedDict()  # user_name -> (cached_at, profiles)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, user_name):
+        """
+        Return the number of saves this process has made for a user, to pass to put.
+
+        Args:
+            user_name (str): The user name.
+
+        Returns:
+            int: The user's generation.
+        """
+        with self._lock:
+            return self._generations.get(user_name, 0)
+
+    def get(self, user_name):
+        """
+        Return a copy of a user's cached profiles, or None if they are not cached.
+
+        Args:
+            user_name (str): The user name to look up.
+
+        Returns:
+            pd.DataFrame or None: The cached profiles.
+        """
+        with self._lock:
+            entry = self._entries.get(user_name)
+            if entry is None or self._clock() - entry[0] > self.ttl:
+                self._entries.pop(user_name, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(user_name)
+            return entry[1].copy()
+
+    def put(self, user_name, df, generation=None):
+        """
+        Cache a user's profiles, evicting the least recently used user if the cache is full.
+
+        Args:
+            user_name (str): The user name the profiles belong to.
+            df (pd.DataFrame): The user's profiles, as returned by load_profile.
+            generation (int, optional): The user's generation from before the profiles were read.
+                If a save has happened since, the profiles may be stale and are not cached.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if generation is not None and self._generations.get(user_name, 0) != generation:
+                return
+            self._entries[user_name] = (self._clock(), df.copy())
+            self._entries.move_to_end(user_name)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def write(self, user_name, profile_name, settings, timestamp_UTC):
+        """
+        Apply a saved profile to a user's cached profiles, if they are cached.
+
+        Args:
+            user_name (str): User name associated with the profile.
+            profile_name (str): Name of the profile.
+            settings (dict): JSON representation of profile settings.
+            timestamp_UTC (datetime): The time the profile was saved.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._generations[user_name] = self._generations.get(user_name, 0) + 1
+            entry = self._entries.get(user_name)
+            if entry is None:
+                return
+            cached_at, df = entry
+            profile = {
+                'user_name': user_name,
+                'profile_name': profile_name,
+                'settings': settings,
+                'timestamp_UTC': timestamp_UTC
+            }
+            # Replace a profile of the same name in place, as the upsert does, or append a new one
+            records = df.to_dict('records')
+            names = [record['profile_name'] for record in records]
+            if profile_name in names:
+                records[names.index(profile_name)] = profile
+            else:
+                records.append(profile)
+            self._entries[user_name] = (cached_at, pd.DataFrame(records, columns=PROFILE_COLUMNS))
+
+    def invalidate(self, user_name=None):
+        """
+        Drop a user's cached profiles, or every user's if no user name is given.
+
+        Args:
+            user_name (str, optional): The user name to drop.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if user_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_name, None)
+
+    def stats(self):
+        """
+        Report the cache's hit and miss counters.
+
+        Returns:
+            dict: The 'hits', 'misses' and cached 'users' counts.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'users': len(self._entries)}
+
+# Cache shared by every session of the app process
+profile_cache = ProfileCache()
+
+@timed("save_profile")
 def save_profile(user_name, profile_name, settings):
     """
-    Save a user profile to the database.
+    Save a user profile to the database, replacing any profile of the same user with the same name.
 
     Args:
         user_name (str): User name associated with the profile.
@@ -51,21 +284,30 @@ def save_profile(user_name, profile_name, settings):
     Returns:
         None
     """
-    # Create a new session
-    session = Session()
+    timestamp_UTC = datetime.utcnow()
 
-    # Create a new profile instance with the provided parameters
-    profile = Profile(
-        user_name=user_name, 
-        profile_name=profile_name, 
-        settings=settings, 
-        timestamp_UTC=datetime.utcnow()
+    # Insert the profile, or update the settings and timestamp of an existing one
+    statement = sqlite_insert(Profile).values(
+        user_name=user_name,
+        profile_name=profile_name,
+        settings=settings,
+        timestamp_UTC=timestamp_UTC
         )
+    statement = statement.on_conflict_do_update(
+        index_elements=['user_name', 'profile_name'],
+        set_={
+            'settings': statement.excluded.settings,
+            'timestamp_UTC': statement.excluded.timestamp_UTC
+        }
+    )
+
+    with session_scope() as session:
+        session.execute(statement)
 
-    # Add the profile to the session and commit the changes to the database
-    session.add(profile)
-    session.commit()
+    # Keep the cached profiles in step with the database
+    profile_cache.write(user_name, profile_name, settings, timestamp_UTC)
 
+@timed("load_profile")
 def load_profile(user_name):
     """
     Load user profiles from the database for a specified user.
@@ -76,11 +318,19 @@ def load_profile(user_name):
     Returns:
         pd.DataFrame: A DataFrame containing profiles with columns 'user_name', 'profile_name', 'settings', and 'timestamp_UTC'.
     """
-    # Create a new session
-    session = Session()
+    # Serve the profiles from the cache when they are already loaded
+    df = profile_cache.get(user_name)
+    if df is not None:
+        return df
 
-    # Query the database to retrieve all profiles for the specified user
-    profiles = session.query(Profile).filter_by(user_name=user_name).all()
+    # Query only the returned columns of the specified user's profiles, noting the saves made so far
+    generation = profile_cache.generation(user_name)
+    with session_scope() as session:
+        profiles = session.execute(
+            select(Profile.profile_name, Profile.settings, Profile.timestamp_UTC)
+            .where(Profile.user_name == user_name)
+            .order_by(Profile.id)
+        ).all()
 
     # Create a list of dictionaries containing 'user_name', 'profile_name', 'settings', and 'timestamp_UTC' for each profile
     profile_data = [
@@ -94,6 +344,7 @@ def load_profile(user_name):
     ]
     
     # Convert the list of dictionaries to a DataFrame
-    df = pd.DataFrame(profile_data)
+    df = pd.DataFrame(profile_data, columns=PROFILE_COLUMNS)
+    profile_cache.put(user_name, df, generation)
 
     return df
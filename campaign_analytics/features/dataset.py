@@ -0,0 +1,469 @@
+import os
+import hashlib
+import threading
+from collections import namedtuple
+from io import BytesIO
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from features.aggregation import aggregate_metrics
+from features.instrumentation import timed
+from features.leaderboard import process_activity_date_columns
+from features.rollup import ROLLUP_LEVELS, build_rollups, extend_rollups
+
+# Explicit schema for the campaign data store
+CAMPAIGN_SCHEMA = pa.schema([
+    ("ACTIVITY_DATE", pa.timestamp("ns")),
+    ("MEDIA_BUYER", pa.dictionary(pa.int32(), pa.string())),
+    ("CAMPAIGN", pa.dictionary(pa.int32(), pa.string())),
+    ("SPEND", pa.float32()),
+    ("REVENUE", pa.float32()),
+    ("DAILY_PROFIT", pa.float32()),
+    ("TOTAL_PROFIT", pa.float32()),
+    ("DAILY_RETURN", pa.float32()),
+    ("TOTAL_RETURN", pa.float32()),
+    ("LANDER_ARRIVALS", pa.int32()),
+    ("SERP_ARRIVALS", pa.int32()),
+    ("AD_CLICKS", pa.int32()),
+    ("ACCEPTED_CLICKS", pa.int32()),
+    ("ACCEPTANCE_RATE", pa.float32()),
+    ("SPEND_PER_ARRIVAL", pa.float32()),
+    ("REVENUE_PER_ARRIVAL", pa.float32()),
+    ("PROFIT_PER_ARRIVAL", pa.float32()),
+])
+
+# Columns summed by the daily rollups
+METRIC_COLUMNS = [field.name for field in CAMPAIGN_SCHEMA if field.name not in ROLLUP_LEVELS[0]]
+
+# CSV parsing types for streamed chunks
+# (integer counts are parsed as floats because some exports write them as '1997.0')
+CHUNK_DTYPES = {
+    field.name: "float64" if pa.types.is_integer(field.type) else "float32"
+    for field in CAMPAIGN_SCHEMA if field.name in METRIC_COLUMNS
+}
+
+# One state of a data file: cheap to hash, so caches key on it instead of hashing DataFrames
+DatasetVersion = namedtuple("DatasetVersion", ["path", "size", "mtime", "rows", "checksum"])
+
+# Statistics of one dataset version, computed once when it is loaded
+DatasetStats = namedtuple("DatasetStats", ["rows", "min_date", "max_date", "buyers", "campaigns"])
+
+# A loaded dataset version with its rollups and statistics
+DatasetHandle = namedtuple("DatasetHandle", ["version", "rollups", "stats"])
+
+# The result of loading a whole CSV file, with the state of the bytes it was loaded from
+LoadedFile = namedtuple("LoadedFile", ["result", "header", "offset", "mtime", "rows", "checksum"])
+
+# The complete rows appended to a CSV file, with the state of the file once they are loaded
+AppendedRows = namedtuple("AppendedRows", ["chunk", "offset", "checksum"])
+
+def dataset_stats(rollups, rows):
+    """
+    Compute the statistics of a dataset from its rollups.
+
+    Parameters:
+    - rollups (dict): The rollups of the dataset, shaped like build_rollups' output.
+    - rows (int): The number of data rows in the dataset.
+
+    Returns:
+    - DatasetStats: The row count, the first and last activity dates, and the media buyers and
+      campaigns in order of first activity.
+    """
+    cube = rollups[ROLLUP_LEVELS[0]]
+    if not len(cube):
+        return DatasetStats(rows, None, None, (), ())
+    return DatasetStats(
+        rows=rows,
+        min_date=cube["ACTIVITY_DATE"].min(),
+        max_date=cube["ACTIVITY_DATE"].max(),
+        buyers=tuple(cube["MEDIA_BUYER"].unique().tolist()),
+        campaigns=tuple(cube["CAMPAIGN"].unique().tolist()),
+    )
+
+def store_path_for(csv_path):
+    """
+    Return the path of the columnar store that mirrors a CSV file.
+
+    Parameters:
+    - csv_path (str): The path to the CSV file.
+
+    Returns:
+    - str: The path to the matching Parquet file.
+    """
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+@timed("ingest_csv")
+def ingest_csv(csv_path, store_path=None):
+    """
+    Convert a campaign CSV file into a typed Parquet store.
+
+    Parameters:
+    - csv_path (str): The path to the CSV file.
+    - store_path (str, optional): The path of the Parquet file to write.
+      Defaults to the CSV path with a '.parquet' extension.
+
+    Returns:
+    - str: The path to the written Parquet file.
+    """
+    if store_path is None:
+        store_path = store_path_for(csv_path)
+
+    # Parse the CSV, reading the text key columns as categoricals
+    df = pd.read_csv(
+        csv_path,
+        dtype={"MEDIA_BUYER": "category", "CAMPAIGN": "category"},
+        engine="pyarrow",
+    )
+    df["ACTIVITY_DATE"] = pd.to_datetime(df["ACTIVITY_DATE"], format="%Y-%m-%d")
+
+    # Cast every column to the store schema
+    table = pa.Table.from_pandas(df[CAMPAIGN_SCHEMA.names], preserve_index=False)
+    table = table.cast(CAMPAIGN_SCHEMA)
+
+    # Write next to the store and rename over it, so no process ever reads a half-written file
+    tmp_path = f"{store_path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, store_path)
+
+    return store_path
+
+def store_is_stale(csv_path, store_path):
+    """
+    Check whether the columnar store needs to be rebuilt from its CSV file.
+
+    Parameters:
+    - csv_path (str): The path to the CSV file.
+    - store_path (str): The path to the Parquet file.
+
+    Returns:
+    - bool: True if the store is missing or older than the CSV file.
+    """
+    if not os.path.exists(store_path):
+        return True
+    return os.path.getmtime(store_path) < os.path.getmtime(csv_path)
+
+@timed("load_dataset")
+def load_dataset(csv_path, columns=None):
+    """
+    Load campaign data from its columnar store, ingesting the CSV first if needed.
+
+    Parameters:
+    - csv_path (str): The path to the source CSV file.
+    - columns (list, optional): The columns to read. Reads every column if not provided.
+
+    Returns:
+    - pd.DataFrame: The loaded DataFrame with the store's types.
+    """
+    store_path = store_path_for(csv_path)
+
+    # Rebuild the store when the CSV has changed since the last ingest
+    if store_is_stale(csv_path, store_path):
+        ingest_csv(csv_path, store_path)
+
+    # Read only the requested columns using a multithreaded reader
+    table = pq.read_table(store_path, columns=columns, use_threads=True)
+
+    return table.to_pandas()
+
+@timed("ingest_csv_chunked")
+def ingest_csv_chunked(csv_path, max_memory_mb=64, sample_rows=1000):
+    """
+    Stream a campaign CSV file in bounded chunks into daily rollups without holding every raw row.
+
+    Parameters:
+    - csv_path (str): The path to the CSV file.
+    - max_memory_mb (float, optional): The memory budget for one parsed chunk, in megabytes.
+    - sample_rows (int, optional): The number of rows used to estimate the size of a parsed row.
+
+    Returns:
+    - tuple: The rollups, shaped like build_rollups' output, and a dict of ingest statistics
+      ('rows', 'chunks', 'chunk_rows', 'peak_chunk_bytes' and 'peak_rollup_bytes').
+    """
+    # Size the chunks from the parsed size of a sample of rows
+    sample = pd.read_csv(csv_path, nrows=sample_rows, dtype=CHUNK_DTYPES)
+    bytes_per_row = max(1, sample.memory_usage(deep=True).sum() / max(1, len(sample)))
+    chunk_rows = max(1, int(max_memory_mb * 2 ** 20 // bytes_per_row))
+
+    stats = {"rows": 0, "chunks": 0, "chunk_rows": chunk_rows, "peak_chunk_bytes": 0, "peak_rollup_bytes": 0}
+    partials = []
+    compacted_rows = 0
+
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype=CHUNK_DTYPES):
+        stats["rows"] += len(chunk)
+        stats["chunks"] += 1
+        stats["peak_chunk_bytes"] = max(stats["peak_chunk_bytes"], int(chunk.memory_usage(deep=True).sum()))
+
+        # Reduce the chunk to its finest rollup before keeping anything from it
+        partials.append(_chunk_rollup(chunk))
+        del chunk
+
+        # Merge the partial rollups whenever they have doubled since the last merge
+        if sum(len(partial) for partial in partials) > 2 * max(compacted_rows, chunk_rows):
+            partials = [_merge_partials(partials)]
+            compacted_rows = len(partials[0])
+        stats["peak_rollup_bytes"] = max(
+            stats["peak_rollup_bytes"], int(sum(partial.memory_usage(deep=True).sum() for partial in partials))
+        )
+
+    cube = _finish_cube(_merge_partials(partials).reset_index())
+
+    return build_rollups(cube, METRIC_COLUMNS), stats
+
+def _chunk_rollup(chunk):
+    """Parse the dates of a raw chunk, derive year/month/day and reduce it to its finest rollup."""
+    chunk = process_activity_date_columns(chunk)
+    return aggregate_metrics(chunk, METRIC_COLUMNS, by=list(ROLLUP_LEVELS[0]))
+
+def _merge_partials(partials):
+    """Sum partial rollups that may share keys into one."""
+    if len(partials) == 1:
+        return partials[0]
+    return pd.concat(partials).groupby(level=list(range(len(ROLLUP_LEVELS[0]))), observed=True).sum()
+
+def _finish_cube(cube):
+    """Store the keys of a merged rollup as categoricals and its counts as integers, like the columnar store."""
+    cube["ACTIVITY_DATE"] = cube["ACTIVITY_DATE"].astype("datetime64[ns]")
+    for column in ("MEDIA_BUYER", "CAMPAIGN"):
+        cube[column] = cube[column].astype("category")
+    for column, dtype in CHUNK_DTYPES.items():
+        if dtype == "float64":
+            cube[column] = cube[column].astype("int64")
+    return cube
+
+class IncrementalLoader:
+    """
+    Keeps the daily rollups of a growing campaign CSV file, parsing only the rows appended since the last refresh.
+
+    Attributes:
+        csv_path (str): The path to the CSV file.
+        rollups (dict): The current rollups, shaped like build_rollups' output.
+        offset (int): The number of bytes of the file ingested so far.
+        rows (int): The number of data rows ingested so far.
+        max_date (pd.Timestamp): The most recent ACTIVITY_DATE ingested so far.
+        handle (DatasetHandle): The current version token, rollups and statistics, replaced every
+            time the rollups change. None before the first refresh.
+
+    Note:
+        Once the file's size or modification time changes, the ingested bytes are checksummed
+        again. If they still match, only the appended rows are parsed; any other change, wherever
+        it is in the file, triggers a full reload. Hashing the ingested bytes is far cheaper than
+        parsing them, and only the appended dates are summed again, so a refresh costs little
+        more than its new rows.
+    """
+
+    def __init__(self, csv_path, full_load=None):
+        """
+        Parameters:
+        - csv_path (str): The path to the CSV file.
+        - full_load (callable, optional): Builds the rollups of the whole file from its path.
+          Defaults to build_rollups over load_dataset.
+        """
+        self.csv_path = csv_path
+        self.full_load = full_load or (lambda path: build_rollups(load_dataset(path)))
+        self.rollups = None
+        self.offset = 0
+        self.rows = 0
+        self.max_date = None
+        self.handle = None
+        self._header = b""
+        self._checksum = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    @timed("IncrementalLoader.refresh")
+    def refresh(self):
+        """
+        Bring the rollups up to date with the file.
+
+        Returns:
+        - bool: True if the rollups changed.
+        """
+        with self._lock:
+            stat = os.stat(self.csv_path)
+            if self.rollups is None or stat.st_size < self.offset:
+                self._reload()
+            elif stat.st_mtime == self._mtime and stat.st_size == self.offset:
+                return False
+            else:
+                # Hash the ingested bytes once, and extend the same digest over any appended rows
+                digest = file_digest(self.csv_path, self.offset)
+                if digest.hexdigest() != self._checksum:
+                    self._reload()
+                elif stat.st_size == self.offset:
+                    self._mtime = stat.st_mtime
+                    return False
+                elif not self._append_tail(stat, digest):
+                    return False
+            self.handle = DatasetHandle(
+                DatasetVersion(self.csv_path, self.offset, self._mtime, self.rows, self._checksum),
+                self.rollups,
+                dataset_stats(self.rollups, self.rows),
+            )
+            return True
+
+    @property
+    def version(self):
+        """The version token of the current rollups, or None before the first refresh."""
+        return self.handle.version if self.handle else None
+
+    def _reload(self):
+        """Rebuild the rollups from the whole file."""
+        loaded = load_whole_file(self.csv_path, self.full_load)
+        cube = loaded.result[ROLLUP_LEVELS[0]]
+        self.rollups = loaded.result
+        self.offset = loaded.offset
+        self.rows = loaded.rows
+        self.max_date = cube["ACTIVITY_DATE"].max() if len(cube) else None
+        self._header = loaded.header
+        self._checksum = loaded.checksum
+        self._mtime = loaded.mtime
+
+    def _append_tail(self, stat, digest):
+        """Parse the complete lines appended since the last refresh and merge them into the rollups."""
+        appended = read_appended_rows(self.csv_path, self._header, self.offset, stat.st_size, digest)
+        if appended is None:
+            return False
+
+        partial = _chunk_rollup(appended.chunk).reset_index()
+        partial["ACTIVITY_DATE"] = partial["ACTIVITY_DATE"].astype("datetime64[ns]")
+        cube = self.rollups[ROLLUP_LEVELS[0]]
+
+        # Keep the keys categorical, widening the categories only when the tail brings new values
+        for column in ("MEDIA_BUYER", "CAMPAIGN"):
+            if not isinstance(cube[column].dtype, pd.CategoricalDtype):
+                cube = cube.assign(**{column: cube[column].astype("category")})
+            categories = cube[column].cat.categories
+            new_values = pd.Index(partial[column].unique()).difference(categories)
+            if len(new_values):
+                categories = categories.append(new_values).sort_values()
+                cube = cube.assign(**{column: cube[column].cat.set_categories(categories)})
+            partial[column] = pd.Categorical(partial[column], categories=categories)
+        partial = partial.astype({column: cube[column].dtype for column in METRIC_COLUMNS})
+
+        # Only the dates from the earliest appended date onwards need to be summed again, at every level
+        first = cube["ACTIVITY_DATE"].searchsorted(partial["ACTIVITY_DATE"].min(), side="left")
+        suffix = pd.concat([cube.iloc[first:], partial], ignore_index=True)
+        suffix = suffix.groupby(list(ROLLUP_LEVELS[0]), observed=True)[METRIC_COLUMNS].sum().reset_index()
+        self.rollups = extend_rollups({**self.rollups, ROLLUP_LEVELS[0]: cube}, suffix, METRIC_COLUMNS)
+
+        self.offset = appended.offset
+        self.rows += len(appended.chunk)
+        self.max_date = self.rollups[ROLLUP_LEVELS[0]]["ACTIVITY_DATE"].iloc[-1]
+        self._checksum = appended.checksum
+        self._mtime = stat.st_mtime
+        return True
+
+def load_whole_file(csv_path, load):
+    """
+    Load a whole CSV file, starting again whenever the file changed while it was being loaded.
+
+    Parameters:
+    - csv_path (str): The path to the CSV file.
+    - load (callable): Loads the file from its path. It may be called more than once.
+
+    Returns:
+    - LoadedFile: The load's result, and the header line, size, modification time, data row count
+      and checksum of the bytes it was loaded from.
+    """
+    while True:
+        before = os.stat(csv_path)
+        result = load(csv_path)
+        after = os.stat(csv_path)
+        if (before.st_size, before.st_mtime) == (after.st_size, after.st_mtime):
+            break
+
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+    return LoadedFile(result, header, after.st_size, after.st_mtime, count_data_rows(csv_path, after.st_size),
+                      file_checksum(csv_path, after.st_size))
+
+def read_appended_rows(csv_path, header, offset, size, digest=None):
+    """
+    Parse the complete lines appended to a CSV file after the bytes already loaded.
+
+    An incomplete last line is left for the next call, since its writer may not have finished it.
+
+    Parameters:
+    - csv_path (str): The path to the CSV file.
+    - header (bytes): The file's header line, including its line break.
+    - offset (int): The number of bytes already loaded.
+    - size (int): The size of the file to read up to.
+    - digest (hashlib.sha1, optional): The file_digest of the bytes already loaded, extended over the
+      appended lines instead of reading those bytes again. Left unchanged.
+
+    Returns:
+    - AppendedRows: The parsed rows, typed with CHUNK_DTYPES, and the size and checksum of the
+      bytes loaded once they are included, or None if no complete line was appended.
+    """
+    with open(csv_path, "rb") as f:
+        f.seek(offset)
+        tail = f.read(size - offset)
+
+    tail = tail[:tail.rfind(b"\n") + 1]
+    if not tail.strip():
+        return None
+
+    chunk = pd.read_csv(BytesIO(header + tail), dtype=CHUNK_DTYPES)
+    digest = file_digest(csv_path, offset) if digest is None else digest.copy()
+    digest.update(tail)
+    return AppendedRows(chunk, offset + len(tail), digest.hexdigest())
+
+def file_digest(path, length):
+    """
+    Hash the first bytes of a file.
+
+    Parameters:
+    - path (str): The path to the file.
+    - length (int): The number of bytes from the start of the file to hash.
+
+    Returns:
+    - hashlib.sha1: The digest, which can be extended with bytes that follow.
+    """
+    digest = hashlib.sha1()
+    remaining = length
+    with open(path, "rb") as f:
+        while remaining > 0:
+            block = f.read(min(2 ** 20, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest
+
+def file_checksum(path, length):
+    """
+    Checksum the first bytes of a file.
+
+    Every byte is hashed, so an edit anywhere in them changes the checksum. Hashing reads the
+    bytes once without parsing them, which is far cheaper than loading them again.
+
+    Parameters:
+    - path (str): The path to the file.
+    - length (int): The number of bytes from the start of the file to checksum.
+
+    Returns:
+    - str: The hex digest.
+    """
+    return file_digest(path, length).hexdigest()
+
+def count_data_rows(csv_path, length=None):
+    """
+    Count the data rows of a CSV file without parsing it.
+
+    Parameters:
+    - csv_path (str): The path to the CSV file.
+    - length (int, optional): The number of bytes from the start of the file to count in. Defaults to the whole file.
+
+    Returns:
+    - int: The number of lines after the header.
+    """
+    remaining = os.path.getsize(csv_path) if length is None else length
+    lines = 0
+    with open(csv_path, "rb") as f:
+        while remaining > 0:
+            block = f.read(min(2 ** 20, remaining))
+            if not block:
+                break
+            lines += block.count(b"\n")
+            remaining -= len(block)
+    return max(0, lines - 1)
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+from features.instrumentation import timed
+
+class DateIndex:
+    """
+    Date-sorted view of a campaign DataFrame answering window queries by binary search.
+
+    Attributes:
+        frame (pd.DataFrame): The indexed DataFrame, sorted by date.
+        date_column (str): The name of the date column.
+        keys (list): The key column combinations that lookups can match, as tuples of column names.
+
+    Note:
+        Date windows are returned as positional slices of 'frame', so they do not copy
+        the data. Key lookups return only the matching rows. The row positions of every key
+        value are built with the index, so the index's size is fully known once it is built.
+    """
+
+    def __init__(self, df, date_column="ACTIVITY_DATE", keys=()):
+        """
+        Parameters:
+        - df (pd.DataFrame): The rows to index, with a date column.
+        - date_column (str, optional): The name of the date column.
+        - keys (list, optional): The key column combinations to index for lookups, as tuples of column names.
+        """
+        # Sort once by date unless already sorted; a stable sort keeps the existing order within a day
+        if not df[date_column].is_monotonic_increasing:
+            df = df.sort_values(date_column, kind="stable")
+        # reset_index copies every column before pandas 3, so keep a frame that is already
+        # positionally indexed, such as rollups memory-mapped from the shared store, as is
+        if not (isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1):
+            df = df.reset_index(drop=True)
+        self.frame = df
+        self.date_column = date_column
+        self._dates = self.frame[date_column].to_numpy(dtype="datetime64[ns]")
+        self.keys = [tuple(columns) for columns in keys]
+        self._key_positions = {columns: self._build_positions(columns) for columns in self.keys}
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def min_date(self):
+        """The earliest date in the index."""
+        return self.frame[self.date_column].iloc[0]
+
+    @property
+    def max_date(self):
+        """The most recent date in the index."""
+        return self.frame[self.date_column].iloc[-1]
+
+    def bounds(self, start=None, end=None, dates=None):
+        """
+        Find the positions delimiting an inclusive date window.
+
+        Parameters:
+        - start (datetime or str, optional): The first date of the window. Unbounded if not provided.
+        - end (datetime or str, optional): The last date of the window. Unbounded if not provided.
+        - dates (np.ndarray, optional): Sorted dates to search. Defaults to the whole index.
+
+        Returns:
+        - tuple: The (low, high) positions of the window.
+        """
+        if dates is None:
+            dates = self._dates
+        low = 0 if start is None else np.searchsorted(dates, pd.Timestamp(start).to_datetime64(), side="left")
+        high = len(dates) if end is None else np.searchsorted(dates, pd.Timestamp(end).to_datetime64(), side="right")
+        return int(low), int(max(low, high))
+
+    @timed("DateIndex.window")
+    def window(self, start=None, end=None):
+        """
+        Return the rows dated within an inclusive window.
+
+        Parameters:
+        - start (datetime or str, optional): The first date of the window.
+        - end (datetime or str, optional): The last date of the window.
+
+        Returns:
+        - pd.DataFrame: A positional slice of the indexed DataFrame.
+        """
+        low, high = self.bounds(start, end)
+        return self.frame.iloc[low:high]
+
+    @timed("DateIndex.lookup")
+    def lookup(self, keys, start=None, end=None):
+        """
+        Return the rows matching the given key values within an inclusive date window.
+
+        Parameters:
+        - keys (dict): The key column names mapped to the values to match.
+        - start (datetime or str, optional): The first date of the window.
+        - end (datetime or str, optional): The last date of the window.
+
+        Returns:
+        - pd.DataFrame: The matching rows, sorted by date.
+
+        Raises:
+        - KeyError: If the key columns were not indexed.
+        """
+        columns = tuple(keys)
+        if columns not in self._key_positions:
+            raise KeyError(f"The date index has no positions for the key columns {columns}.")
+        positions = self._key_positions[columns]
+        value = tuple(keys[column] for column in columns)
+        if len(columns) == 1:
+            value = value[0]
+        rows = positions.get(value, np.empty(0, dtype=np.intp))
+
+        # Rows of one key keep the index's date order, so the window is a binary search
+        low, high = self.bounds(start, end, dates=self._dates[rows])
+        return self.frame.take(rows[low:high])
+
+    def _build_positions(self, columns):
+        """Build the row positions of every value of a key combination."""
+        group_key = list(columns) if len(columns) > 1 else columns[0]
+        return self.frame.groupby(group_key, observed=True, sort=False).indices
@@ -0,0 +1,99 @@
+import numpy as np
+
+def lttb_indices(x, y, n_out):
+    """
+    Select points of a series with the Largest-Triangle-Three-Buckets algorithm.
+
+    Parameters:
+    - x (array-like): The x values, sorted ascending (datetimes are allowed).
+    - y (array-like): The y values.
+    - n_out (int): The number of points to keep.
+
+    Returns:
+    - np.ndarray: The positions of the kept points, in order. The first and last points are always kept.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x).astype("int64") if np.asarray(x).dtype.kind == "M" else np.asarray(x)
+    x = x.astype("float64")
+    y = np.asarray(y, dtype="float64")
+
+    # The points between the first and the last are split into n_out - 2 buckets
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(int) + 1
+    edges[-1] = n - 1
+
+    indices = np.empty(n_out, dtype=np.intp)
+    indices[0] = 0
+    selected = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # The third triangle vertex is the average of the next bucket, or the last point
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+
+        # Keep the point of this bucket forming the largest triangle with its neighbours
+        areas = np.abs(
+            (x[selected] - next_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (next_y - y[selected])
+        )
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+
+    indices[-1] = n - 1
+    return indices
+
+def minmax_indices(y, n_out):
+    """
+    Select the minimum and maximum point of each bucket of a series.
+
+    Parameters:
+    - y (array-like): The y values.
+    - n_out (int): The largest number of points to keep.
+
+    Returns:
+    - np.ndarray: The positions of the kept points, in order. The first and last points are always kept.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype="float64")
+    buckets = (n_out - 2) // 2
+    edges = (np.arange(buckets + 1) * (n - 2) / buckets).astype(int) + 1
+    edges[-1] = n - 1
+
+    kept = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            kept.append(start + int(np.argmin(y[start:end])))
+            kept.append(start + int(np.argmax(y[start:end])))
+    return np.unique(kept)
+
+def downsample(df, column, n_out, method="lttb"):
+    """
+    Downsample a DataFrame indexed by date for plotting one of its columns, keeping its visual extremes.
+
+    Parameters:
+    - df (pd.DataFrame): The series to plot, indexed by sorted dates.
+    - column (str): The column to plot.
+    - n_out (int): The number of points to keep.
+    - method (str, optional): 'lttb' for Largest-Triangle-Three-Buckets, or 'minmax' for the
+      minimum and maximum of each bucket.
+
+    Returns:
+    - pd.DataFrame: The selected rows of the DataFrame.
+    """
+    if len(df) <= n_out:
+        return df
+
+    if method == "lttb":
+        indices = lttb_indices(df.index.to_numpy(), df[column].to_numpy(), n_out)
+    elif method == "minmax":
+        indices = minmax_indices(df[column].to_numpy(), n_out)
+    else:
+        raise ValueError("Invalid method. Supported values are 'lttb' or 'minmax'.")
+
+    return df.iloc[indices]
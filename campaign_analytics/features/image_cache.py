@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from features.image_search import get_session, read_limited, decode_image, MAX_IMAGE_BYTES, REQUEST_TIMEOUT
+
+# Seconds a newly written image is kept even with no URL record pointing at it yet, since its
+# record is written just after it
+ORPHAN_GRACE_SECONDS = 60
+
+class ImageCache:
+    """
+    Content-addressed on-disk cache of downloaded images and their thumbnails.
+
+    Attributes:
+        directory (str): The folder holding the cache.
+        max_bytes (int): The disk budget for URL records, image bytes and thumbnails, in bytes.
+        max_age (float): Seconds a cached image is served without asking the origin again.
+
+    Note:
+        Each URL maps, by the hash of the URL, to a small JSON record naming the hash of its
+        content and the origin's ETag and Last-Modified validators. Image bytes and thumbnails are
+        stored once per content hash, so URLs serving the same image share them. Older entries are
+        revalidated with a conditional request when the origin sent validators, and the least
+        recently used files, records included, are evicted once the cache exceeds its budget.
+        Evicting a record also deletes the image and thumbnails no other record points to, and
+        evicting an image also deletes the records pointing to it.
+    """
+
+    def __init__(self, directory="image_cache", max_bytes=512 * 2 ** 20, max_age=24 * 60 * 60):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        for folder in ("urls", "blobs", "thumbs"):
+            os.makedirs(os.path.join(directory, folder), exist_ok=True)
+
+    def fetch(self, url, http=None, max_bytes=MAX_IMAGE_BYTES, timeout=REQUEST_TIMEOUT):
+        """
+        Return an image's bytes from the cache, downloading or revalidating them when needed.
+
+        Parameters:
+        - url (str): The image URL.
+        - http (requests.Session, optional): The session to download with. Defaults to the shared session.
+        - max_bytes (int, optional): The largest body accepted, in bytes.
+        - timeout (tuple, optional): The (connect, read) timeouts in seconds.
+
+        Returns:
+        bytes: The image body.
+        """
+        record = self._read_record(url)
+        blob_path = self._blob_path(record["content_hash"]) if record else None
+        if record and not os.path.exists(blob_path):
+            # The image was evicted; drop its record along with it
+            self._remove(self._record_path(url))
+            record = None
+
+        # Serve fresh entries, and entries the origin cannot revalidate, without any request
+        if record and (time.time() - record["stored_at"] < self.max_age
+                       or not (record.get("etag") or record.get("last_modified"))):
+            return self._read_file(blob_path)
+
+        # Ask the origin whether a cached entry is still current
+        headers = {}
+        if record:
+            if record.get("etag"):
+                headers["If-None-Match"] = record["etag"]
+            if record.get("last_modified"):
+                headers["If-Modified-Since"] = record["last_modified"]
+
+        http = http or get_session()
+        with http.get(url, stream=True, timeout=timeout, headers=headers) as response:
+            if record and response.status_code == 304:
+                record["stored_at"] = time.time()
+                self._write_record(url, record)
+                return self._read_file(blob_path)
+            response.raise_for_status()
+            content = read_limited(response, max_bytes)
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+
+        self.store(url, content, **validators)
+        return content
+
+    def store(self, url, content, etag=None, last_modified=None):
+        """
+        Store an image's bytes under its content hash and point its URL at them.
+
+        Parameters:
+        - url (str): The image URL.
+        - content (bytes): The image body.
+        - etag (str, optional): The origin's ETag for the image.
+        - last_modified (str, optional): The origin's Last-Modified date for the image.
+
+        Returns:
+        str: The content hash of the image.
+        """
+        content_hash = hashlib.sha256(content).hexdigest()
+        blob_path = self._blob_path(content_hash)
+        if not os.path.exists(blob_path):
+            self._write_file(blob_path, content)
+        self._write_record(url, {
+            "url": url,
+            "content_hash": content_hash,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": time.time(),
+        })
+        self.evict()
+        return content_hash
+
+    def thumbnail(self, url, size, http=None, max_bytes=MAX_IMAGE_BYTES, timeout=REQUEST_TIMEOUT):
+        """
+        Return an image's thumbnail from the cache, creating it from the cached image when needed.
+
+        Parameters:
+        - url (str): The image URL.
+        - size (tuple): The (width, height) box the thumbnail fits in.
+        - http (requests.Session, optional): The session to download with. Defaults to the shared session.
+        - max_bytes (int, optional): The largest body accepted, in bytes.
+        - timeout (tuple, optional): The (connect, read) timeouts in seconds.
+
+        Returns:
+        Image: A PIL Image object of the thumbnail.
+        """
+        content = self.fetch(url, http, max_bytes, timeout)
+        content_hash = hashlib.sha256(content).hexdigest()
+        thumb_path = os.path.join(self.directory, "thumbs", f"{content_hash}_{size[0]}x{size[1]}.png")
+
+        if os.path.exists(thumb_path):
+            return decode_image(self._read_file(thumb_path))
+
+        img = decode_image(content, size)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(thumb_path))
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, "PNG")
+        os.replace(tmp_path, thumb_path)
+        self.evict()
+        return img
+
+    def size(self):
+        """
+        Report the disk space used by URL records, cached image bytes and thumbnails.
+
+        Returns:
+        int: The total size in bytes.
+        """
+        return sum(os.path.getsize(path) for path, _ in self._cached_files())
+
+    def evict(self):
+        """
+        Delete the least recently used URL records, image bytes and thumbnails until the cache fits
+        its budget, along with the records and images left without a counterpart.
+
+        Returns:
+        None
+        """
+        with self._lock:
+            files = sorted(self._cached_files(), key=lambda item: item[1].st_mtime)
+            total = sum(stat.st_size for _, stat in files)
+            evicted = False
+            for path, stat in files:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= stat.st_size
+                evicted = True
+            if evicted:
+                self._prune()
+
+    def _prune(self):
+        """Delete URL records whose image is gone, and images and thumbnails no URL record points to."""
+        referenced = set()
+        with os.scandir(os.path.join(self.directory, "urls")) as entries:
+            for entry in entries:
+                try:
+                    with open(entry.path, "rb") as f:
+                        content_hash = json.loads(f.read())["content_hash"]
+                except (FileNotFoundError, ValueError, KeyError):
+                    continue
+                if os.path.exists(self._blob_path(content_hash)):
+                    referenced.add(content_hash)
+                else:
+                    self._remove(entry.path)
+
+        # Spare files being written, and images just written, whose records may not be written yet
+        written_before = time.time() - ORPHAN_GRACE_SECONDS
+        for folder in ("blobs", "thumbs"):
+            with os.scandir(os.path.join(self.directory, folder)) as entries:
+                for entry in entries:
+                    content_hash = entry.name.split("_")[0]
+                    if entry.name.startswith("tmp") or content_hash in referenced:
+                        continue
+                    try:
+                        if folder == "thumbs" or entry.stat().st_mtime < written_before:
+                            self._remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+
+    def _cached_files(self):
+        """List the (path, stat) of every URL record, cached image and thumbnail file."""
+        files = []
+        for folder in ("urls", "blobs", "thumbs"):
+            with os.scandir(os.path.join(self.directory, folder)) as entries:
+                files.extend((entry.path, entry.stat()) for entry in entries if entry.is_file())
+        return files
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.directory, "blobs", content_hash)
+
+    def _record_path(self, url):
+        return os.path.join(self.directory, "urls", hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _read_record(self, url):
+        try:
+            return json.loads(self._read_file(self._record_path(url)))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_record(self, url, record):
+        self._write_file(self._record_path(url), json.dumps(record).encode("utf-8"))
+
+    def _read_file(self, path):
+        """Read a cached file and mark it as recently used."""
+        with open(path, "rb") as f:
+            content = f.read()
+        os.utime(path)
+        return content
+
+    def _remove(self, path):
+        """Delete a cached file that another session may already have deleted."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _write_file(self, path, content):
+        """Write a file atomically, so concurrent readers never see it half written."""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
@@ -1,7 +1,187 @@
-from google_images_search import GoogleImagesSearch
-import requests
-from PIL import Image
+import time
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from features.instrumentation import timed
+
+# Limits applied to every image download
+MAX_DOWNLOAD_WORKERS = 8
+MAX_IMAGE_BYTES = 10 * 2 ** 20
+REQUEST_TIMEOUT = (5, 30)  # (connect, read) seconds
+CHUNK_BYTES = 64 * 2 ** 10
+
+# How long, in seconds, and how many search results are reused before querying the API again
+SEARCH_CACHE_TTL = 6 * 60 * 60
+SEARCH_CACHE_ENTRIES = 256
+
+# The parts of a search result the app uses
+ImageResult = namedtuple("ImageResult", ["url", "description"])
+
+# google_images_search, requests and PIL are imported on first use, so that importing this
+# module (and starting the app) does not pay for them until an image is searched or downloaded
+
+def create_search_client(developer_key, cx):
+    """
+    Create a Google Images Search client.
+
+    Parameters:
+    - developer_key (str): The Google Cloud API key.
+    - cx (str): The custom search engine ID.
+
+    Returns:
+    GoogleImagesSearch: The search client.
+    """
+    from google_images_search import GoogleImagesSearch
+    return GoogleImagesSearch(developer_key, cx)
+
+def create_session(pool_size=MAX_DOWNLOAD_WORKERS):
+    """
+    Create an HTTP session that keeps a pool of connections alive between downloads.
+
+    Parameters:
+    - pool_size (int, optional): The number of connections kept per host.
+
+    Returns:
+    requests.Session: The pooled session.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# Session shared by every download in the process, created by the first download
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """
+    Return the HTTP session shared by every download in the process, creating it on first use.
+
+    Returns:
+    requests.Session: The pooled session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+class SearchResultCache:
+    """
+    Bounded in-process cache of image search results that expire after a time to live.
+
+    Attributes:
+        ttl (float): Seconds a cached result is reused.
+        max_entries (int): The number of queries kept before the least recently used is evicted.
+        hits (int): The number of searches answered from the cache.
+        misses (int): The number of searches that had to query the API.
+    """
+
+    def __init__(self, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_ENTRIES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(search_params):
+        """
+        Normalize search parameters so equivalent queries share a cache entry.
+
+        Parameters:
+        - search_params (dict): The Google Images Search parameters.
+
+        Returns:
+        tuple: The normalized (q, num, safe) key.
+        """
+        query = " ".join(str(search_params.get("q", "")).lower().split())
+        return query, int(search_params.get("num", 1)), str(search_params.get("safe", "off")).lower()
+
+    def get(self, search_params):
+        """
+        Return the cached results of a search, or None if they are missing or expired.
+
+        Parameters:
+        - search_params (dict): The Google Images Search parameters.
+
+        Returns:
+        list or None: The cached ImageResult objects.
+        """
+        key = self.key(search_params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._clock() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return list(entry[1])
+
+    def put(self, search_params, results):
+        """
+        Cache the results of a search, evicting the least recently used query if the cache is full.
+
+        Parameters:
+        - search_params (dict): The Google Images Search parameters.
+        - results (list): The ImageResult objects to cache.
+
+        Returns:
+        None
+        """
+        key = self.key(search_params)
+        with self._lock:
+            self._entries[key] = (self._clock(), list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """
+        Report the cache's hit and miss counters.
+
+        Returns:
+        dict: The 'hits', 'misses' and cached 'queries' counts.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "queries": len(self._entries)}
+
+# Cache shared by every session of the app process
+search_cache = SearchResultCache()
+
+@timed("search_images")
+def search_images(client, search_params, cache=search_cache):
+    """
+    Search for images, reusing cached results of an equivalent recent search.
+
+    Parameters:
+    - client (GoogleImagesSearch): The search client, used only on a cache miss.
+    - search_params (dict): The Google Images Search parameters ('q', 'num' and 'safe').
+    - cache (SearchResultCache, optional): The result cache. Pass None to always query the API.
+
+    Returns:
+    list: ImageResult objects with the URL and description of each result.
+    """
+    if cache is not None:
+        results = cache.get(search_params)
+        if results is not None:
+            return results
+
+    # Query the API and keep only what the app needs from each result
+    client.search(search_params=search_params)
+    results = [ImageResult(image.url, image.description) for image in client.results()]
+
+    if cache is not None:
+        cache.put(search_params, results)
+    return results
 
 def display_image(image):
     """
@@ -16,21 +196,126 @@ def display_image(image):
     # Return the image URL and description
     return image.url, image.description
 
-def download_image(image):
+def fetch_image_bytes(url, http=None, max_bytes=MAX_IMAGE_BYTES, timeout=REQUEST_TIMEOUT):
+    """
+    Stream an image's bytes from a URL, stopping at a size limit.
+
+    Parameters:
+    - url (str): The image URL.
+    - http (requests.Session, optional): The session to download with. Defaults to the shared session.
+    - max_bytes (int, optional): The largest body accepted, in bytes.
+    - timeout (tuple, optional): The (connect, read) timeouts in seconds.
+
+    Returns:
+    bytes: The image body.
+
+    Raises:
+    ValueError: If the body is larger than max_bytes.
+    """
+    http = http or get_session()
+    with http.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        return read_limited(response, max_bytes)
+
+def read_limited(response, max_bytes=MAX_IMAGE_BYTES):
+    """
+    Read a streamed response body, stopping at a size limit.
+
+    Parameters:
+    - response (requests.Response): A response opened with stream=True.
+    - max_bytes (int, optional): The largest body accepted, in bytes.
+
+    Returns:
+    bytes: The response body.
+
+    Raises:
+    ValueError: If the body is larger than max_bytes.
+    """
+    # Refuse bodies that announce themselves as too large before reading them
+    if int(response.headers.get("Content-Length") or 0) > max_bytes:
+        raise ValueError(f"Image at {response.url} exceeds {max_bytes} bytes.")
+
+    content = BytesIO()
+    for chunk in response.iter_content(CHUNK_BYTES):
+        content.write(chunk)
+        if content.tell() > max_bytes:
+            raise ValueError(f"Image at {response.url} exceeds {max_bytes} bytes.")
+
+    return content.getvalue()
+
+def decode_image(content, thumbnail_size=None):
+    """
+    Decode image bytes with PIL, optionally shrinking the image to a thumbnail.
+
+    Parameters:
+    - content (bytes): The encoded image.
+    - thumbnail_size (tuple, optional): The (width, height) box the image is shrunk to fit.
+
+    Returns:
+    Image: A PIL Image object.
+    """
+    from PIL import Image
+
+    img = Image.open(BytesIO(content))
+    img.load()
+    if thumbnail_size:
+        img.thumbnail(thumbnail_size)
+    return img
+
+def download_image(image, http=None, max_bytes=MAX_IMAGE_BYTES, timeout=REQUEST_TIMEOUT, cache=None):
     """
     Download an image from a given URL.
 
     Parameters:
     - image (GoogleImagesSearch.ImageResult): An image result object from Google Images Search.
+    - http (requests.Session, optional): The session to download with. Defaults to the shared session.
+    - max_bytes (int, optional): The largest body accepted, in bytes.
+    - timeout (tuple, optional): The (connect, read) timeouts in seconds.
+    - cache (ImageCache, optional): An on-disk cache to serve and store the image bytes.
 
     Returns:
     Image: A PIL Image object representing the downloaded image.
     """
-    # Send a GET request to the image URL
-    response = requests.get(image.url)
+    # Serve the image body from the cache when one is given
+    if cache is not None:
+        return decode_image(cache.fetch(image.url, http, max_bytes, timeout))
 
-    # Open the image using PIL (Python Imaging Library)
-    img = Image.open(BytesIO(response.content))
+    # Stream the image body and open it using PIL (Python Imaging Library)
+    return decode_image(fetch_image_bytes(image.url, http, max_bytes, timeout))
 
-    # Return the PIL Image object
-    return img
+@timed("download_images")
+def download_images(images, max_workers=MAX_DOWNLOAD_WORKERS, thumbnail_size=None, http=None,
+                    max_bytes=MAX_IMAGE_BYTES, timeout=REQUEST_TIMEOUT, cache=None):
+    """
+    Download and decode several images concurrently.
+
+    Parameters:
+    - images (list): Image result objects with a 'url' attribute.
+    - max_workers (int, optional): The most downloads in flight at once.
+    - thumbnail_size (tuple, optional): The (width, height) box each image is shrunk to fit.
+    - http (requests.Session, optional): The session to download with. Defaults to the shared session.
+    - max_bytes (int, optional): The largest body accepted per image, in bytes.
+    - timeout (tuple, optional): The (connect, read) timeouts in seconds.
+    - cache (ImageCache, optional): An on-disk cache to serve and store the image bytes and thumbnails.
+
+    Returns:
+    list: A PIL Image object for each input image, in order, or None where the download or decoding failed.
+    """
+    import requests
+
+    def fetch(image):
+        # Download and decode on the worker thread
+        try:
+            if cache is not None:
+                if thumbnail_size:
+                    return cache.thumbnail(image.url, thumbnail_size, http, max_bytes, timeout)
+                return decode_image(cache.fetch(image.url, http, max_bytes, timeout))
+            return decode_image(fetch_image_bytes(image.url, http, max_bytes, timeout), thumbnail_size)
+        except (requests.RequestException, ValueError, OSError):
+            return None
+
+    images = list(images)
+    if not images:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(images))) as executor:
+        return list(executor.map(fetch, images))
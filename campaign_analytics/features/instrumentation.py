@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+
+# Reruns kept per session for the performance panel
+HISTORY_SIZE = 20
+
+class PerformanceRecorder:
+    """
+    Records timing spans for each Streamlit rerun and exports them.
+
+    Attributes:
+        totals (dict): Per-stage [calls, seconds] accumulated over every recorded rerun of the process.
+        last_seconds (float): The duration of the most recent recorded rerun of the process, or None.
+        prometheus_path (str): A file rewritten in Prometheus text format after each rerun, or None.
+        log_path (str): A rotating log receiving one JSON line per rerun, or None.
+
+    Note:
+        Spans are recorded only while the current thread is inside a rerun started with recording
+        enabled, so the cost when recording is off is a single attribute lookup per span.
+        The recorder is shared by every session, so it keeps only the process totals it exports;
+        each session keeps the reruns it shows from what end_rerun returns.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.last_seconds = None
+        self.prometheus_path = None
+        self.log_path = None
+        self._logger = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def exporting(self):
+        """Whether reruns are exported to a log or a Prometheus file."""
+        return bool(self.prometheus_path or self.log_path)
+
+    def configure(self, prometheus_path=None, log_path=None, log_max_bytes=5 * 2 ** 20, log_backups=3):
+        """
+        Configure where recorded reruns are exported.
+
+        Parameters:
+        - prometheus_path (str, optional): A file to rewrite in Prometheus text format after each rerun.
+        - log_path (str, optional): A rotating log to append one JSON line per rerun to.
+        - log_max_bytes (int, optional): The size at which the log rotates.
+        - log_backups (int, optional): The number of rotated logs kept.
+        """
+        self.prometheus_path = prometheus_path
+        if log_path and log_path != self.log_path:
+            logger = logging.getLogger("campaign_analytics.performance")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            handler = RotatingFileHandler(log_path, maxBytes=log_max_bytes, backupCount=log_backups)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.handlers = [handler]
+            self._logger = logger
+        self.log_path = log_path
+
+    def start_rerun(self, enabled):
+        """
+        Start recording the spans of a rerun on the current thread.
+
+        Parameters:
+        - enabled (bool): Whether to record this rerun. Reruns are always recorded while exporting.
+        """
+        if enabled or self.exporting:
+            self._local.spans = []
+            self._local.depth = 0
+            self._local.started = time.time()
+            self._local.start = time.perf_counter()
+        else:
+            self._local.spans = None
+
+    def end_rerun(self):
+        """
+        Finish the current thread's rerun, add it to the process totals and export it.
+
+        Returns:
+        - dict: The recorded rerun, or None if it was not recorded.
+        """
+        spans = getattr(self._local, "spans", None)
+        if spans is None:
+            return None
+        self._local.spans = None
+
+        rerun = {
+            "started": self._local.started,
+            "seconds": time.perf_counter() - self._local.start,
+            "spans": spans,
+        }
+        with self._lock:
+            self.last_seconds = rerun["seconds"]
+            for name, _, seconds in spans:
+                calls_seconds = self.totals.setdefault(name, [0, 0.0])
+                calls_seconds[0] += 1
+                calls_seconds[1] += seconds
+            if self._logger:
+                self._logger.info(json.dumps(rerun))
+            if self.prometheus_path:
+                self._write_prometheus()
+        return rerun
+
+    def span(self, name):
+        """
+        Time a block of code as a stage of the current rerun.
+
+        Parameters:
+        - name (str): The stage name.
+
+        Returns:
+        A context manager; a no-op one when the current rerun is not recorded.
+        """
+        if getattr(self._local, "spans", None) is None:
+            return nullcontext()
+        return self._span(name)
+
+    @contextmanager
+    def _span(self, name):
+        # Spans are kept in start order, so nested stages follow their caller
+        spans = self._local.spans
+        depth = self._local.depth
+        position = len(spans)
+        spans.append((name, depth, 0.0))
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            spans[position] = (name, depth, time.perf_counter() - start)
+            self._local.depth = depth
+
+    def _write_prometheus(self):
+        """Rewrite the Prometheus text file atomically with the accumulated totals."""
+        lines = [
+            "# HELP campaign_analytics_stage_calls_total Recorded calls of each dashboard stage.",
+            "# TYPE campaign_analytics_stage_calls_total counter",
+        ]
+        lines += [f'campaign_analytics_stage_calls_total{{stage="{name}"}} {calls}'
+                  for name, (calls, _) in sorted(self.totals.items())]
+        lines += [
+            "# HELP campaign_analytics_stage_seconds_total Seconds spent in each dashboard stage.",
+            "# TYPE campaign_analytics_stage_seconds_total counter",
+        ]
+        lines += [f'campaign_analytics_stage_seconds_total{{stage="{name}"}} {seconds:.6f}'
+                  for name, (_, seconds) in sorted(self.totals.items())]
+        lines += [
+            "# HELP campaign_analytics_last_rerun_seconds Duration of the most recent recorded rerun.",
+            "# TYPE campaign_analytics_last_rerun_seconds gauge",
+            f"campaign_analytics_last_rerun_seconds {self.last_seconds:.6f}",
+        ]
+
+        directory = os.path.dirname(os.path.abspath(self.prometheus_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".prom.tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prometheus_path)
+
+# Recorder shared by every session of the app process
+recorder = PerformanceRecorder()
+
+def span(name):
+    """
+    Time a block of code as a stage of the current rerun.
+
+    Parameters:
+    - name (str): The stage name.
+
+    Returns:
+    A context manager; a no-op one when the current rerun is not recorded.
+    """
+    return recorder.span(name)
+
+def timed(name):
+    """
+    Decorate a function so each call is recorded as a stage of the current rerun.
+
+    Parameters:
+    - name (str): The stage name.
+
+    Returns:
+    The decorator.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with recorder.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
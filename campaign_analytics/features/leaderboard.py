@@ -1,5 +1,13 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from features.date_index import DateIndex
+from features.instrumentation import timed
+from features.parallel import parallel_aggregate_metrics
+
+# Number of days each leaderboard frequency rolls back
+# (a month is approximated as 30 days because month lengths vary)
+FREQUENCY_DAYS = {'weekly': 7, 'monthly': 30, 'yearly': 365}
 
 def process_activity_date_columns(df):
     """
@@ -36,28 +44,22 @@ def calculate_start_date(end_date, frequency):
     end_date = datetime.strptime(end_date, '%Y-%m-%d')
 
     # Calculate start_date based on frequency
-    if frequency == 'weekly':
-        start_date = end_date - timedelta(weeks=1)
-    elif frequency == 'monthly':
-        # Subtracting a month can be tricky due to varying days in each month
-        # This approach subtracts 30 days, which is a common approximation
-        start_date = end_date - timedelta(days=30)
-    elif frequency == 'yearly':
-        start_date = end_date - timedelta(days=365)
-    else:
+    if frequency not in FREQUENCY_DAYS:
         raise ValueError("Invalid frequency. Supported values are 'weekly', 'monthly', or 'yearly'.")
+    start_date = end_date - timedelta(days=FREQUENCY_DAYS[frequency])
 
     # Convert start_date back to string format
     start_date_str = start_date.strftime('%Y-%m-%d')
 
     return start_date_str
 
+@timed("generate_leaderboard")
 def generate_leaderboard(df, end_date, frequency=None):
     """
     Generate a leaderboard based on total profit for a selected time period.
 
     Parameters:
-    - df (pd.DataFrame): The input DataFrame containing the data.
+    - df (pd.DataFrame or DateIndex): The input DataFrame containing the data, or a DateIndex over it.
     - end_date (str): The end date of the desired time period in 'YYYY-MM-DD' format.
     - frequency (str, optional): The frequency to roll back to. Supported values are 'weekly', 'monthly', or 'yearly'.
       If not provided, the function will use the entire available data.
@@ -70,14 +72,33 @@ def generate_leaderboard(df, end_date, frequency=None):
         start_date = calculate_start_date(end_date, frequency)
     else:
         # If frequency is not provided, use the entire available data
-        start_date = df['ACTIVITY_DATE'].min()
+        start_date = None
 
     # Filter DataFrame for the selected time period
-    selected_period_df = df[(df['ACTIVITY_DATE'] >= start_date) & (df['ACTIVITY_DATE'] <= end_date)]
+    if isinstance(df, DateIndex):
+        selected_period_df = df.window(start_date, end_date)
+    else:
+        if start_date is None:
+            start_date = df['ACTIVITY_DATE'].min()
+        selected_period_df = df[(df['ACTIVITY_DATE'] >= start_date) & (df['ACTIVITY_DATE'] <= end_date)]
 
     # Group by 'media_buyer' and calculate total profit for each category buyer
-    category_profit = selected_period_df.groupby('MEDIA_BUYER')['TOTAL_PROFIT'].sum().reset_index()
+    # (sums are widened to float64 so rounding is exact for compact float columns)
+    category_profit = parallel_aggregate_metrics(selected_period_df, ['TOTAL_PROFIT'], by='MEDIA_BUYER')['TOTAL_PROFIT'].astype('float64').reset_index()
+
+    return format_leaderboard(category_profit)
 
+def format_leaderboard(category_profit):
+    """
+    Rank media buyers by their total profit over a period.
+
+    Parameters:
+    - category_profit (pd.DataFrame): One row per media buyer active in the period, ordered by
+      media buyer, with 'MEDIA_BUYER' and float64 'TOTAL_PROFIT' columns.
+
+    Returns:
+    - pd.DataFrame: The leaderboard, with 'NAME', 'DOLLAR_AMOUNT', 'PERCENTAGE' and 'RANKING' columns.
+    """
     # Calculate overall sum of total profit for percentage calculation
     overall_sum = category_profit['TOTAL_PROFIT'].sum()
 
@@ -99,3 +120,135 @@ def generate_leaderboard(df, end_date, frequency=None):
     category_profit = category_profit.reset_index(drop=True)
 
     return category_profit
+
+@timed("generate_rank_history")
+def generate_rank_history(df, frequency=None, metric="TOTAL_PROFIT"):
+    """
+    Compute every media buyer's rolling-window total and dense rank for every date at once.
+
+    Parameters:
+    - df (pd.DataFrame): The input DataFrame containing the data.
+    - frequency (str, optional): The window to roll over. Supported values are 'weekly', 'monthly', or 'yearly'.
+      If not provided, totals accumulate from the beginning of the data.
+    - metric (str, optional): The metric to total and rank on. Defaults to 'TOTAL_PROFIT'.
+
+    Returns:
+    - tuple: Two (date x media buyer) DataFrames holding the window totals and the rankings.
+      Buyers with no activity in a date's window are NaN in both.
+    """
+    # Sum the metric and count the rows for each date and media buyer
+    grouped = df.groupby(["ACTIVITY_DATE", "MEDIA_BUYER"], observed=True)[metric].agg(["sum", "count"])
+    calendar = pd.date_range(grouped.index.levels[0].min(), grouped.index.levels[0].max(), freq="D")
+    sums = grouped["sum"].astype("float64").unstack(fill_value=0.0).reindex(calendar, fill_value=0.0)
+    counts = grouped["count"].unstack(fill_value=0).reindex(calendar, fill_value=0)
+
+    # Roll over the same inclusive window as generate_leaderboard
+    if frequency:
+        if frequency not in FREQUENCY_DAYS:
+            raise ValueError("Invalid frequency. Supported values are 'weekly', 'monthly', or 'yearly'.")
+        window = FREQUENCY_DAYS[frequency] + 1
+        totals = sums.rolling(window, min_periods=1).sum()
+        active = counts.rolling(window, min_periods=1).sum() > 0
+    else:
+        totals = sums.cumsum()
+        active = counts.cumsum() > 0
+
+    # Rank the active buyers of each date against each other
+    totals = totals.where(active)
+    rankings = totals.rank(axis=1, ascending=False, method="dense")
+    totals.index.name = rankings.index.name = "ACTIVITY_DATE"
+
+    return totals, rankings
+
+def frequency_window(end_date, frequency=None):
+    """
+    Build the (start_date, end_date) window a leaderboard frequency covers.
+
+    Parameters:
+    - end_date (str): The end date of the window in 'YYYY-MM-DD' format.
+    - frequency (str, optional): 'weekly', 'monthly' or 'yearly'. If not provided,
+      the window starts at the beginning of the data.
+
+    Returns:
+    - tuple: The (start_date, end_date) window, with None for an open start.
+    """
+    start_date = calculate_start_date(end_date, frequency) if frequency else None
+    return start_date, end_date
+
+class LeaderboardIndex:
+    """
+    Per-media-buyer prefix sums of a metric over days, answering any window's leaderboard by lookup.
+
+    Attributes:
+        metric (str): The metric the leaderboards rank on.
+        dates (np.ndarray): The sorted distinct activity dates.
+        buyers (np.ndarray): The media buyers, one per prefix-sum column.
+
+    Note:
+        Row i of the prefix sums holds the totals of the first i dates, so a window's
+        totals are the difference of two rows.
+    """
+
+    def __init__(self, df, metric="TOTAL_PROFIT"):
+        self.metric = metric
+
+        # Sum the metric and count the rows for each date and media buyer
+        grouped = df.groupby(["ACTIVITY_DATE", "MEDIA_BUYER"], observed=True)[metric].agg(["sum", "count"])
+        sums = grouped["sum"].astype("float64").unstack(fill_value=0.0)
+        counts = grouped["count"].unstack(fill_value=0)
+
+        self.dates = sums.index.to_numpy(dtype="datetime64[ns]")
+        self.buyers = np.asarray(sums.columns)
+
+        # Prefix sums over days, with a leading row of zeros
+        self._sums = np.vstack([np.zeros(len(self.buyers)), np.cumsum(sums.to_numpy(), axis=0)])
+        self._counts = np.vstack([np.zeros(len(self.buyers), dtype=np.int64), np.cumsum(counts.to_numpy(), axis=0)])
+
+    @property
+    def max_date(self):
+        """The most recent date in the index."""
+        return pd.Timestamp(self.dates[-1])
+
+    @timed("LeaderboardIndex.leaderboards")
+    def leaderboards(self, windows):
+        """
+        Generate the leaderboard of every window in one vectorized pass.
+
+        Parameters:
+        - windows (list): (start_date, end_date) tuples with inclusive bounds, as returned
+          by frequency_window. A start date of None covers all earlier data.
+
+        Returns:
+        - list: One leaderboard DataFrame per window, shaped like generate_leaderboard's output.
+        """
+        # Locate every window in the date axis at once
+        starts = np.array([pd.Timestamp(start).to_datetime64() if start is not None else self.dates[0]
+                           for start, _ in windows], dtype="datetime64[ns]")
+        ends = np.array([pd.Timestamp(end).to_datetime64() for _, end in windows], dtype="datetime64[ns]")
+        low = np.searchsorted(self.dates, starts, side="left")
+        high = np.maximum(low, np.searchsorted(self.dates, ends, side="right"))
+
+        # Window totals and activity are the difference of two prefix rows
+        totals = self._sums[high] - self._sums[low]
+        present = (self._counts[high] - self._counts[low]) > 0
+        totals = np.where(present, totals, np.nan)
+
+        # Calculate percentage and dense rank across the buyers of each window
+        overall_sums = np.nansum(totals, axis=1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            percentages = np.round(totals / overall_sums * 100, 2)
+        rankings = pd.DataFrame(totals).rank(axis=1, ascending=False, method="dense").to_numpy()
+
+        leaderboards = []
+        for row in range(len(windows)):
+            active = present[row]
+            leaderboard = pd.DataFrame({
+                "NAME": self.buyers[active],
+                "DOLLAR_AMOUNT": totals[row, active].round(2),
+                "PERCENTAGE": percentages[row, active],
+                "RANKING": rankings[row, active].astype(int),
+            })
+            leaderboard = leaderboard.sort_values(by="DOLLAR_AMOUNT", ascending=False).reset_index(drop=True)
+            leaderboards.append(leaderboard)
+
+        return leaderboards
@@ -0,0 +1,193 @@
+import os
+import time
+import threading
+import pandas as pd
+import pyarrow as pa
+from features.dataset import DatasetHandle, DatasetVersion, dataset_stats, load_dataset, load_whole_file
+from features.instrumentation import timed
+from features.rollup import ROLLUP_LEVELS, build_rollups
+
+# A rebuild lock older than this, in seconds, is assumed to belong to a process that died
+STALE_LOCK_SECONDS = 10 * 60
+
+# How often, in seconds, a process without any store waits for another process to finish writing it
+STORE_POLL_SECONDS = 0.2
+
+def mapped_store_path_for(csv_path):
+    """
+    Return the path of the memory-mapped rollup store that mirrors a CSV file.
+
+    Parameters:
+    - csv_path (str): The path to the CSV file.
+
+    Returns:
+    - str: The path to the matching Arrow IPC file.
+    """
+    return os.path.splitext(csv_path)[0] + ".rollup.arrow"
+
+@timed("write_mapped_store")
+def write_mapped_store(cube, store_path, rows, checksum):
+    """
+    Write the finest rollup as an uncompressed Arrow IPC file and atomically swap it in.
+
+    Parameters:
+    - cube (pd.DataFrame): The (date, buyer, campaign) rollup, sorted by its keys.
+    - store_path (str): The path of the store to replace.
+    - rows (int): The number of data rows of the source CSV file, kept in the file's metadata.
+    - checksum (str): The checksum of the source CSV file, kept in the file's metadata.
+
+    Returns:
+    - str: The path to the written store.
+    """
+    # One uncompressed record batch, so every column is a single contiguous buffer that maps as is
+    table = pa.Table.from_pandas(cube, preserve_index=False).combine_chunks()
+    metadata = dict(table.schema.metadata or {})
+    metadata.update({b"rows": str(rows).encode(), b"checksum": checksum.encode()})
+    table = table.replace_schema_metadata(metadata)
+
+    # Write next to the store and rename over it; processes that mapped the old file keep reading it
+    tmp_path = f"{store_path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=max(1, table.num_rows))
+    os.replace(tmp_path, store_path)
+
+    return store_path
+
+@timed("map_store")
+def map_store(store_path):
+    """
+    Memory-map a rollup store read-only as a DataFrame.
+
+    Parameters:
+    - store_path (str): The path to the Arrow IPC file.
+
+    Returns:
+    - tuple: The rollup DataFrame, and the source row count and checksum from the file's metadata.
+
+    Note:
+        Date and numeric columns are NumPy views of the mapped file, so their pages are shared
+        through the OS page cache by every process mapping it. Categorical codes and labels are
+        copied, which is small next to the metrics.
+    """
+    table = pa.ipc.open_file(pa.memory_map(store_path, "r")).read_all()
+
+    columns = {}
+    for name in table.column_names:
+        column = table.column(name)
+        column = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+        if pa.types.is_dictionary(column.type):
+            columns[name] = pd.Categorical.from_codes(column.indices.to_numpy(zero_copy_only=False),
+                                                      categories=column.dictionary.to_pandas())
+        else:
+            columns[name] = column.to_numpy(zero_copy_only=False)
+
+    metadata = table.schema.metadata or {}
+    rows = int(metadata.get(b"rows", b"0"))
+    checksum = metadata.get(b"checksum", b"").decode()
+    return pd.DataFrame(columns, copy=False), rows, checksum
+
+class MappedStoreLoader:
+    """
+    Serves the daily rollups of a campaign CSV file from a memory-mapped Arrow store shared by
+    every app process on the host.
+
+    Attributes:
+        csv_path (str): The path to the CSV file.
+        store_path (str): The path to the Arrow IPC store.
+        handle (DatasetHandle): The current version token, rollups and statistics, replaced every
+            time a new store is mapped. None before the first refresh.
+
+    Note:
+        The first process to find the store missing or older than the CSV file rebuilds it under
+        a lock file and swaps it in with os.replace. Every process maps the new file on its next
+        refresh; the old file's pages stay valid for as long as they are referenced. The coarser
+        rollups are summed from the mapped one in each process, and are small next to it.
+    """
+
+    def __init__(self, csv_path, full_load=None, store_path=None):
+        """
+        Parameters:
+        - csv_path (str): The path to the CSV file.
+        - full_load (callable, optional): Builds the rollups of the whole file from its path.
+          Defaults to build_rollups over load_dataset.
+        - store_path (str, optional): The path to the Arrow IPC store. Defaults to the CSV path
+          with a '.rollup.arrow' extension.
+        """
+        self.csv_path = csv_path
+        self.store_path = store_path or mapped_store_path_for(csv_path)
+        self.full_load = full_load or (lambda path: build_rollups(load_dataset(path)))
+        self.handle = None
+        self._store_key = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        """The version token of the current rollups, or None before the first refresh."""
+        return self.handle.version if self.handle else None
+
+    @timed("MappedStoreLoader.refresh")
+    def refresh(self):
+        """
+        Rebuild the store if the CSV file has changed, and map the store if it has been replaced.
+
+        Returns:
+        - bool: True if the rollups changed.
+        """
+        with self._lock:
+            self._ensure_store()
+
+            stat = os.stat(self.store_path)
+            store_key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            if store_key == self._store_key:
+                return False
+
+            cube, rows, checksum = map_store(self.store_path)
+            rollups = build_rollups(cube, presummed=True)
+            self.handle = DatasetHandle(
+                DatasetVersion(self.csv_path, stat.st_size, stat.st_mtime, rows, checksum),
+                rollups,
+                dataset_stats(rollups, rows),
+            )
+            self._store_key = store_key
+            return True
+
+    def _store_is_stale(self):
+        """Check whether the store is missing or older than the CSV file."""
+        if not os.path.exists(self.store_path):
+            return True
+        return os.path.getmtime(self.store_path) < os.path.getmtime(self.csv_path)
+
+    def _ensure_store(self):
+        """Rebuild a stale store, or wait for another process to write a missing one."""
+        while self._store_is_stale():
+            if self._try_rebuild():
+                return
+            # Another process is rebuilding; keep serving the current store until it is swapped in
+            if os.path.exists(self.store_path):
+                return
+            time.sleep(STORE_POLL_SECONDS)
+
+    def _try_rebuild(self):
+        """Rebuild the store unless another process holds the rebuild lock. Returns whether it was rebuilt."""
+        lock_path = self.store_path + ".lock"
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            # Take over the lock of a process that died while rebuilding
+            try:
+                if time.time() - os.path.getmtime(lock_path) > STALE_LOCK_SECONDS:
+                    os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+            return False
+
+        try:
+            # Another process may have finished rebuilding just before the lock was taken
+            if not self._store_is_stale():
+                return True
+            loaded = load_whole_file(self.csv_path, self.full_load)
+            write_mapped_store(loaded.result[ROLLUP_LEVELS[0]], self.store_path, loaded.rows, loaded.checksum)
+            return True
+        finally:
+            os.remove(lock_path)
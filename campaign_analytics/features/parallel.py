@@ -0,0 +1,163 @@
+import os
+import threading
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from features.aggregation import aggregate_metrics, DEFAULT_METRICS
+from features.instrumentation import timed
+
+# Aggregations over fewer rows than this stay in the calling process, where they beat the pool's overhead
+PARALLEL_MIN_ROWS = 2_000_000
+
+# Worker processes of the aggregation pool; 1 disables the pool
+PARALLEL_WORKERS = min(8, os.cpu_count() or 1)
+
+# Pool shared by every aggregation in the process, started by the first large one
+_pool = None
+_pool_lock = threading.Lock()
+
+def configure_parallelism(workers=None, min_rows=None):
+    """
+    Configure the process pool used by parallel_aggregate_metrics.
+
+    Parameters:
+    - workers (int, optional): The number of worker processes; 1 keeps every aggregation in-process.
+    - min_rows (int, optional): The smallest number of rows aggregated in the pool.
+
+    Returns:
+    None
+    """
+    global PARALLEL_WORKERS, PARALLEL_MIN_ROWS, _pool
+    with _pool_lock:
+        if workers is not None and workers != PARALLEL_WORKERS:
+            PARALLEL_WORKERS = workers
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+                _pool = None
+        if min_rows is not None:
+            PARALLEL_MIN_ROWS = min_rows
+
+def get_pool():
+    """
+    Return the aggregation pool, starting it on first use.
+
+    Returns:
+    ProcessPoolExecutor: The pool. Workers are spawned rather than forked, since the app's server is multithreaded.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PARALLEL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+@timed("parallel_aggregate_metrics")
+def parallel_aggregate_metrics(df, metrics=None, by="ACTIVITY_DATE", partition_by=None, workers=None, min_rows=None):
+    """
+    Sum several metrics for each group, splitting large inputs across a process pool.
+
+    The rows are partitioned on one of the group keys, so every group falls in exactly one
+    partition and keeps its row order; the partial sums are then concatenated and sorted, which
+    gives exactly the result of aggregate_metrics.
+
+    Parameters:
+    - df (pd.DataFrame): The input DataFrame containing the data.
+    - metrics (list, optional): The metric columns to sum. Defaults to DEFAULT_METRICS.
+    - by (str or list, optional): The column(s) to group by. Defaults to 'ACTIVITY_DATE'.
+    - partition_by (str, optional): The group key to partition on: MEDIA_BUYER partitions by buyer,
+      ACTIVITY_DATE by date range. Defaults to MEDIA_BUYER when grouping by it, else the first key.
+    - workers (int, optional): The number of partitions. Defaults to PARALLEL_WORKERS.
+    - min_rows (int, optional): The smallest input aggregated in the pool. Defaults to PARALLEL_MIN_ROWS.
+
+    Returns:
+    - pd.DataFrame: A wide DataFrame indexed by the group key(s) with one column per metric.
+    """
+    metrics = list(DEFAULT_METRICS if metrics is None else metrics)
+    keys = [by] if isinstance(by, str) else list(by)
+    if partition_by is None:
+        partition_by = "MEDIA_BUYER" if "MEDIA_BUYER" in keys else keys[0]
+    workers = PARALLEL_WORKERS if workers is None else workers
+    min_rows = PARALLEL_MIN_ROWS if min_rows is None else min_rows
+
+    # Small inputs stay in-process, as do columns of Python objects, which cannot be shared
+    if workers < 2 or len(df) < min_rows or partition_by not in keys:
+        return aggregate_metrics(df, metrics, by)
+    inputs = {name: _column_values(df[name]) for name in dict.fromkeys(keys + metrics)}
+    if any(values.dtype == object for values, _ in inputs.values()):
+        return aggregate_metrics(df, metrics, by)
+
+    order, bounds = _partition_rows(inputs[partition_by][0], workers)
+    if len(bounds) < 2:
+        return aggregate_metrics(df, metrics, by)
+
+    # Share the input columns and the partitions' row positions with the workers instead of pickling them
+    inputs["__order__"] = (order, None)
+    columns, blocks = {}, []
+    try:
+        for name, (values, categories) in inputs.items():
+            block = shared_memory.SharedMemory(create=True, size=max(1, values.nbytes))
+            np.ndarray(values.shape, values.dtype, buffer=block.buf)[:] = values
+            blocks.append(block)
+            columns[name] = (block.name, values.dtype.str, len(values), categories)
+
+        futures = [get_pool().submit(_aggregate_partition, columns, low, high, metrics, by) for low, high in bounds]
+        partials = [future.result() for future in futures]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    # Partitions of the leading key come back in order; any other partitioning needs a sort
+    result = pd.concat(partials)
+    return result if result.index.is_monotonic_increasing else result.sort_index()
+
+def _partition_rows(values, partitions):
+    """
+    Split the rows of a key column into partitions of contiguous key ranges with similar row counts.
+
+    Parameters:
+    - values (np.ndarray): The key column to partition on.
+    - partitions (int): The largest number of partitions.
+
+    Returns:
+    - tuple: The row positions ordered by partition, keeping the row order within each, and the
+      (start, stop) bounds of every non-empty partition in that order, in key order.
+    """
+    keys, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+
+    # Give each key the partition its first row falls in, so no key is split
+    starts = np.cumsum(counts) - counts
+    key_partition = np.minimum(starts * partitions // len(values), partitions - 1)
+    row_partition = key_partition[inverse.ravel()]
+
+    order = np.argsort(row_partition, kind="stable")
+    bounds = np.searchsorted(row_partition[order], np.arange(partitions + 1))
+    return order, [(int(low), int(high)) for low, high in zip(bounds[:-1], bounds[1:]) if high > low]
+
+def _column_values(column):
+    """Return a column as a plain NumPy array and, for categoricals, its categories."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(), column.cat.categories
+    return column.to_numpy(), None
+
+def _aggregate_partition(columns, low, high, metrics, by):
+    """Aggregate one partition in a worker process, reading its rows from shared memory."""
+    blocks, arrays = [], {}
+    try:
+        for name, (block_name, dtype, length, categories) in columns.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = (np.ndarray((length,), np.dtype(dtype), buffer=block.buf), categories)
+
+        # Copy out only this partition's rows
+        rows = arrays.pop("__order__")[0][low:high]
+        data = {}
+        for name, (values, categories) in arrays.items():
+            values = values[rows]
+            data[name] = values if categories is None else pd.Categorical.from_codes(values, categories=categories)
+        del arrays, rows
+        return aggregate_metrics(pd.DataFrame(data), metrics, by)
+    finally:
+        for block in blocks:
+            block.close()
@@ -0,0 +1,93 @@
+import pandas as pd
+from features.aggregation import aggregate_metrics
+from features.parallel import parallel_aggregate_metrics
+from features.instrumentation import timed
+
+# Rollup levels from finest to coarsest
+ROLLUP_LEVELS = [
+    ("ACTIVITY_DATE", "MEDIA_BUYER", "CAMPAIGN"),
+    ("ACTIVITY_DATE", "MEDIA_BUYER"),
+    ("ACTIVITY_DATE",),
+]
+
+@timed("build_rollups")
+def build_rollups(df, metrics=None, presummed=False):
+    """
+    Build the daily rollups of a campaign DataFrame at every level in ROLLUP_LEVELS.
+
+    Parameters:
+    - df (pd.DataFrame): The row-level campaign DataFrame.
+    - metrics (list, optional): The metric columns to sum. Defaults to every
+      numeric column that is not a rollup key.
+    - presummed (bool, optional): Whether df already is the finest rollup, sorted by
+      its keys. It is then used as is, without copying it.
+
+    Returns:
+    - dict: A mapping of each level's key tuple to its rollup DataFrame, with
+      the keys as regular columns sorted by date.
+    """
+    if metrics is None:
+        metrics = [
+            column for column in df.select_dtypes("number").columns
+            if column not in ROLLUP_LEVELS[0]
+        ]
+
+    rollups = {}
+    source = df
+    for level in ROLLUP_LEVELS:
+        if presummed and level == ROLLUP_LEVELS[0]:
+            rollups[level] = df
+            continue
+        # Each level is summed from the previous, finer rollup; the raw rows are summed in parallel when large
+        aggregate = parallel_aggregate_metrics if source is df else aggregate_metrics
+        rollups[level] = aggregate(source, metrics, by=list(level)).reset_index()
+        source = rollups[level]
+
+    return rollups
+
+@timed("extend_rollups")
+def extend_rollups(rollups, suffix, metrics):
+    """
+    Replace every rollup's rows from a date onwards with those summed from a new finest suffix.
+
+    Parameters:
+    - rollups (dict): The rollups returned by build_rollups.
+    - suffix (pd.DataFrame): The finest rollup of every date from its first date onwards, sorted by
+      its keys, with the same columns as the finest rollup and categoricals at least as wide.
+    - metrics (list): The metric columns to sum.
+
+    Returns:
+    - dict: The new rollups. Only the suffix's dates are summed again; earlier rows are reused as is.
+    """
+    start = suffix["ACTIVITY_DATE"].iloc[0]
+    extended = {}
+    source = suffix
+    for level in ROLLUP_LEVELS:
+        part = suffix if level == ROLLUP_LEVELS[0] else aggregate_metrics(source, metrics, by=list(level)).reset_index()
+        source = part
+
+        rollup = rollups[level]
+        prefix = rollup.iloc[:rollup["ACTIVITY_DATE"].searchsorted(start, side="left")]
+        # Recode the keys of the earlier rows when the suffix brings new categories
+        prefix = prefix.astype({column: part[column].dtype for column in level if prefix[column].dtype != part[column].dtype})
+        extended[level] = pd.concat([prefix, part], ignore_index=True)
+
+    return extended
+
+def select_rollup(rollups, columns):
+    """
+    Select the smallest rollup that can answer a query over the given key columns.
+
+    Parameters:
+    - rollups (dict): The rollups returned by build_rollups.
+    - columns (list): The key columns the query filters or groups on.
+
+    Returns:
+    - pd.DataFrame: The coarsest rollup whose keys cover every requested column.
+    """
+    # Walk from the coarsest level to the finest
+    for level in reversed(ROLLUP_LEVELS):
+        if set(columns).issubset(level):
+            return rollups[level]
+
+    raise ValueError(f"No rollup covers the columns {list(columns)}.")
@@ -0,0 +1,208 @@
+import sys
+import time
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from functools import wraps
+
+def estimate_bytes(obj, seen=None):
+    """
+    Estimate the memory held by an object and everything it references.
+
+    Parameters:
+    - obj: The object to measure. DataFrames, Series, indexes and NumPy arrays are measured
+      exactly; containers and plain objects are walked recursively.
+    - seen (set, optional): The ids of objects already counted, which are skipped. The ids of the
+      objects measured are added to it.
+
+    Returns:
+    - int: The estimated size in bytes. Objects referenced more than once are counted once.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes) if obj.dtype != object else int(obj.nbytes) + sum(estimate_bytes(item, seen) for item in obj.flat)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_bytes(k, seen) + estimate_bytes(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(estimate_bytes(item, seen) for item in obj)
+    if hasattr(obj, "__dict__") and not isinstance(obj, type):
+        return sys.getsizeof(obj) + estimate_bytes(vars(obj), seen)
+    return sys.getsizeof(obj)
+
+class SharedCache:
+    """
+    Process-wide LRU cache of read-only results, shared by every session and bounded by a memory budget.
+
+    Attributes:
+        max_bytes (int): The memory budget. Once the cached results exceed it, the least recently
+            used unpinned results are evicted.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that had to compute their result.
+        evictions (int): The number of results evicted to stay within the budget.
+
+    Note:
+        Results are returned as-is rather than copied, so every session shares one object per
+        result and callers must treat them as read-only: pandas before 3.0 has no copy-on-write
+        by default, so a change made in place would be seen by every session. Concurrent lookups
+        of a missing key wait for a single computation instead of each computing the result.
+        Results are measured once, when they are stored, leaving out the objects pinned results
+        already hold: an index over the pinned dataset counts only what it adds to the dataset.
+    """
+
+    def __init__(self, max_bytes=512 * 2 ** 20, sizeof=estimate_bytes):
+        """
+        Parameters:
+        - max_bytes (int, optional): The memory budget, in bytes.
+        - sizeof (callable, optional): Measures a result given the set of ids of objects already
+          counted, adding the ids it measures to that set. Defaults to estimate_bytes.
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sizeof = sizeof
+        self._entries = OrderedDict()  # key -> [value, bytes, pinned, hits, last_used]
+        self._pinned_ids = {}  # key -> ids of the objects a pinned result holds
+        self._pending = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached result of a key, computing and caching it on a miss.
+
+        Parameters:
+        - key (hashable): The cache key.
+        - compute (callable): Computes the result, without arguments.
+
+        Returns:
+        The cached or computed result.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    entry[3] += 1
+                    entry[4] = time.time()
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                pending = self._pending.get(key)
+                if pending is None:
+                    self.misses += 1
+                    pending = self._pending[key] = threading.Event()
+                    break
+            # Another session is computing this key; use its result once it is cached
+            pending.wait()
+
+        try:
+            value = compute()
+            self._store(key, value, pinned=False)
+            return value
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.set()
+
+    def pin(self, key, value):
+        """
+        Cache a result that is never evicted, replacing the key's previous result.
+
+        Parameters:
+        - key (hashable): The cache key.
+        - value: The result, such as the loaded dataset every derived result is computed from.
+
+        Returns:
+        None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is value:
+                return
+        self._store(key, value, pinned=True)
+
+    def memoize(self, fn):
+        """
+        Decorate a function so its results are cached under its name and arguments.
+
+        Parameters:
+        - fn (callable): The function to cache. Its arguments must be hashable.
+
+        Returns:
+        The decorated function.
+        """
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (fn.__qualname__, args, tuple(sorted(kwargs.items())))
+            return self.get_or_compute(key, lambda: fn(*args, **kwargs))
+        return wrapper
+
+    def report(self):
+        """
+        Report the memory held by each cached result.
+
+        Returns:
+        - pd.DataFrame: One row per result, largest first, with its 'key', 'bytes', whether it is
+          'pinned', its 'hits' and when it was 'last_used'.
+        """
+        with self._lock:
+            rows = [
+                {"key": repr(key), "bytes": size, "pinned": pinned, "hits": hits, "last_used": pd.Timestamp(last_used, unit="s")}
+                for key, (_, size, pinned, hits, last_used) in self._entries.items()
+            ]
+        return pd.DataFrame(rows, columns=["key", "bytes", "pinned", "hits", "last_used"]).sort_values("bytes", ascending=False, ignore_index=True)
+
+    def stats(self):
+        """
+        Report the cache's totals and counters.
+
+        Returns:
+        - dict: The cached 'bytes', the 'max_bytes' budget, and the 'entries', 'hits', 'misses' and 'evictions' counts.
+        """
+        with self._lock:
+            return {"bytes": self._bytes, "max_bytes": self.max_bytes, "entries": len(self._entries),
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def clear(self):
+        """Drop every unpinned result."""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if not entry[2]]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def _store(self, key, value, pinned):
+        """Cache a result, then evict the least recently used unpinned results until within the budget."""
+        # Objects the pinned results hold are counted once, with them
+        with self._lock:
+            counted = set().union(*[ids for pinned_key, ids in self._pinned_ids.items() if pinned_key != key])
+
+        # Measure outside the lock; deep sizes of large frames take a moment
+        seen = set(counted)
+        size = self._sizeof(value, seen)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            if pinned:
+                self._pinned_ids[key] = seen - counted
+            else:
+                self._pinned_ids.pop(key, None)
+            self._entries[key] = [value, size, pinned, 0, time.time()]
+            self._bytes += size
+
+            for candidate in [key for key, entry in self._entries.items() if not entry[2]]:
+                if self._bytes <= self.max_bytes:
+                    break
+                self._bytes -= self._entries.pop(candidate)[1]
+                self.evictions += 1
+
+# Cache shared by every session of the app process
+shared_cache = SharedCache()
@@ -0,0 +1,400 @@
+import os
+import threading
+import pandas as pd
+from sqlalchemy import (create_engine, event, delete, func, insert, select, update,
+                        Column, Date, Float, Index, Integer, MetaData, String, Table)
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.schema import CreateIndex, CreateTable
+from features.aggregation import aggregate_metrics, DEFAULT_METRICS
+from features.database import BUSY_TIMEOUT_SECONDS, configure_sqlite_connection
+from features.dataset import (CHUNK_DTYPES, METRIC_COLUMNS, DatasetHandle, DatasetStats, DatasetVersion,
+                              file_digest, load_whole_file, read_appended_rows)
+from features.instrumentation import timed
+from features.leaderboard import format_leaderboard, frequency_window
+from features.rollup import ROLLUP_LEVELS
+
+# Raw CSV rows parsed at a time while loading a file
+SQL_CHUNK_ROWS = 500_000
+
+metadata = MetaData()
+
+# Daily sums of every metric per campaign, one row per (date, buyer, campaign) and loaded chunk.
+# A key may repeat across chunks, so every query sums; appended rows are inserted as they are.
+campaign_rollups = Table(
+    "campaign_rollups", metadata,
+    Column("ACTIVITY_DATE", Date, nullable=False),
+    Column("MEDIA_BUYER", String, nullable=False),
+    Column("CAMPAIGN", String, nullable=False),
+    *[Column(name, Integer if dtype == "float64" else Float) for name, dtype in CHUNK_DTYPES.items()],
+    Index("ix_campaign_rollups_buyer_campaign_date", "MEDIA_BUYER", "CAMPAIGN", "ACTIVITY_DATE"),
+    Index("ix_campaign_rollups_date", "ACTIVITY_DATE"),
+)
+
+# The state of the CSV file the rollups were loaded from: how many bytes and rows, and their checksum
+campaign_sources = Table(
+    "campaign_sources", metadata,
+    Column("path", String, primary_key=True),
+    Column("offset", Integer, nullable=False),
+    Column("mtime", Float, nullable=False),
+    Column("rows", Integer, nullable=False),
+    Column("checksum", String, nullable=False),
+    Column("header", String, nullable=False),
+)
+
+def sql_url_for(csv_path):
+    """
+    Return the URL of the SQLite database that mirrors a CSV file.
+
+    Parameters:
+    - csv_path (str): The path to the CSV file.
+
+    Returns:
+    - str: An SQLAlchemy URL of the '.sqlite' file next to the CSV file.
+    """
+    return "sqlite:///" + os.path.splitext(csv_path)[0] + ".sqlite"
+
+def create_campaign_engine(url):
+    """
+    Create an engine for a campaign database, configuring SQLite for concurrent readers and writers.
+
+    Parameters:
+    - url (str): The SQLAlchemy URL of the database.
+
+    Returns:
+    - Engine: The engine, with the campaign tables created.
+    """
+    if not url.startswith("sqlite"):
+        engine = create_engine(url)
+    else:
+        engine = create_engine(url, connect_args={"timeout": BUSY_TIMEOUT_SECONDS, "check_same_thread": False})
+        event.listen(engine, "connect", configure_sqlite_connection)
+
+    # Every app process may create the tables at once, so each statement checks for itself
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            connection.execute(CreateTable(table, if_not_exists=True))
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+    return engine
+
+def _day_bounds(start, end):
+    """Round a window inwards to whole days, as dates; None stays an open bound."""
+    start = pd.Timestamp(start).ceil("D").date() if start is not None else None
+    end = pd.Timestamp(end).floor("D").date() if end is not None else None
+    return start, end
+
+def _within(statement, start, end):
+    """Restrict a query to the activity dates of an inclusive window."""
+    start, end = _day_bounds(start, end)
+    if start is not None:
+        statement = statement.where(campaign_rollups.c.ACTIVITY_DATE >= start)
+    if end is not None:
+        statement = statement.where(campaign_rollups.c.ACTIVITY_DATE <= end)
+    return statement
+
+class SqlCampaignStore:
+    """
+    Keeps the daily rollups of a campaign CSV file in an embedded SQL database and answers the
+    dashboard's queries there, so only their small results are held in memory.
+
+    Attributes:
+        csv_path (str): The path to the CSV file.
+        url (str): The SQLAlchemy URL of the database. Holds the rollups of one CSV file.
+        engine (Engine): The engine connected to the database.
+        handle (DatasetHandle): The current version token and statistics, replaced every time the
+            database changes. Its rollups are None: the data stays in the database. None before
+            the first refresh.
+
+    Note:
+        Like IncrementalLoader, rows appended to the file are loaded on the next refresh and any
+        other change reloads the whole file. Every app process may share one SQLite database:
+        a process only writes after checking, in the same transaction, that the state it read is
+        still current, and otherwise picks up the other process's result. DuckDB can be used
+        through its SQLAlchemy dialect (duckdb_engine), by one process at a time.
+    """
+
+    def __init__(self, csv_path, url=None, chunk_rows=SQL_CHUNK_ROWS):
+        """
+        Parameters:
+        - csv_path (str): The path to the CSV file.
+        - url (str, optional): The SQLAlchemy URL of the database. Defaults to a SQLite file next
+          to the CSV file with a '.sqlite' extension.
+        - chunk_rows (int, optional): The number of raw rows parsed at a time while loading.
+        """
+        self.csv_path = csv_path
+        self.url = url or sql_url_for(csv_path)
+        self.chunk_rows = chunk_rows
+        self.engine = create_campaign_engine(self.url)
+        self.handle = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        """The version token of the loaded data, or None before the first refresh."""
+        return self.handle.version if self.handle else None
+
+    @timed("SqlCampaignStore.refresh")
+    def refresh(self):
+        """
+        Bring the database up to date with the file.
+
+        Returns:
+        - bool: True if the data changed, here or in another process.
+        """
+        with self._lock:
+            while True:
+                state = self._read_state()
+                try:
+                    if self._update(state):
+                        break
+                except OperationalError as error:
+                    if "locked" not in str(error):
+                        raise
+                    # Another process holds the database for a long load; serve the current data, if any, meanwhile
+                    if self.handle is not None:
+                        break
+
+            state = self._read_state()
+            version = DatasetVersion(self.csv_path, state["offset"], state["mtime"], state["rows"], state["checksum"])
+            if version == self.version:
+                return False
+            self.handle = DatasetHandle(version, None, self._stats(state["rows"]))
+            return True
+
+    def _read_state(self):
+        """Read the state of the loaded file, or None if the database is empty."""
+        with self.engine.connect() as connection:
+            row = connection.execute(select(campaign_sources)).mappings().first()
+        return dict(row) if row is not None else None
+
+    def _update(self, state):
+        """Load whatever changed in the file since 'state'. Returns False if another process changed the state first."""
+        stat = os.stat(self.csv_path)
+        if state is None or state["path"] != self.csv_path or stat.st_size < state["offset"]:
+            return self._reload(state)
+        if stat.st_size == state["offset"] and stat.st_mtime == state["mtime"]:
+            return True
+        # Hash the loaded bytes once, and extend the same digest over any appended rows
+        digest = file_digest(self.csv_path, state["offset"])
+        if digest.hexdigest() != state["checksum"]:
+            return self._reload(state)
+        if stat.st_size == state["offset"]:
+            # Only touched: remember the new modification time to skip the checksum next time
+            with self.engine.begin() as connection:
+                return self._claim(connection, state, mtime=stat.st_mtime)
+        return self._append_tail(state, stat, digest)
+
+    def _claim(self, connection, state, **values):
+        """
+        Take the write lock and check that the loaded state is still 'state', updating it with 'values'.
+
+        Returns:
+        - bool: False if another process has changed the state since it was read.
+        """
+        if state is None:
+            try:
+                connection.execute(insert(campaign_sources).values(path=self.csv_path, offset=0, mtime=0.0,
+                                                                   rows=0, checksum="", header=""))
+            except IntegrityError:
+                return False
+            return True
+        result = connection.execute(
+            update(campaign_sources)
+            .where(campaign_sources.c.path == state["path"])
+            .where(campaign_sources.c.offset == state["offset"])
+            .where(campaign_sources.c.checksum == state["checksum"])
+            .values(mtime=values.pop("mtime", state["mtime"]), **values)
+        )
+        return result.rowcount == 1
+
+    @timed("SqlCampaignStore.reload")
+    def _reload(self, state):
+        """Replace the rollups with those of the whole file."""
+        with self.engine.connect() as connection:
+            transaction = connection.begin()
+            if not self._claim(connection, state):
+                transaction.rollback()
+                return False
+
+            def load(path):
+                # Each attempt replaces the rows of the previous one within the transaction
+                connection.execute(delete(campaign_rollups))
+                for chunk in pd.read_csv(path, chunksize=self.chunk_rows, dtype=CHUNK_DTYPES):
+                    self._insert_chunk(connection, chunk)
+
+            loaded = load_whole_file(self.csv_path, load)
+            connection.execute(delete(campaign_sources))
+            connection.execute(insert(campaign_sources).values(
+                path=self.csv_path, offset=loaded.offset, mtime=loaded.mtime, rows=loaded.rows,
+                checksum=loaded.checksum, header=loaded.header.decode(),
+            ))
+            transaction.commit()
+
+        if self.engine.dialect.name == "sqlite":
+            # Refresh the planner's statistics for the indexes
+            with self.engine.begin() as connection:
+                connection.exec_driver_sql("ANALYZE")
+        return True
+
+    def _append_tail(self, state, stat, digest):
+        """Load the complete lines appended since 'state', given the digest of the bytes it loaded."""
+        appended = read_appended_rows(self.csv_path, state["header"].encode(), state["offset"], stat.st_size, digest)
+        if appended is None:
+            return True
+
+        with self.engine.begin() as connection:
+            if not self._claim(connection, state, offset=appended.offset, mtime=stat.st_mtime,
+                               rows=state["rows"] + len(appended.chunk), checksum=appended.checksum):
+                return False
+            self._insert_chunk(connection, appended.chunk)
+        return True
+
+    def _insert_chunk(self, connection, chunk):
+        """Reduce raw rows to their daily rollup and insert it."""
+        chunk["ACTIVITY_DATE"] = pd.to_datetime(chunk["ACTIVITY_DATE"])
+        partial = aggregate_metrics(chunk, METRIC_COLUMNS, by=list(ROLLUP_LEVELS[0])).reset_index()
+        partial["ACTIVITY_DATE"] = partial["ACTIVITY_DATE"].dt.date
+        partial = partial.astype({name: "int64" for name, dtype in CHUNK_DTYPES.items() if dtype == "float64"})
+        if len(partial):
+            connection.execute(insert(campaign_rollups), partial.to_dict("records"))
+
+    def _stats(self, rows):
+        """Compute the statistics of the loaded data."""
+        first_active = func.min(campaign_rollups.c.ACTIVITY_DATE)
+        with self.engine.connect() as connection:
+            min_date, max_date = connection.execute(
+                select(first_active, func.max(campaign_rollups.c.ACTIVITY_DATE))
+            ).one()
+            if min_date is None:
+                return DatasetStats(rows, None, None, (), ())
+            buyers = connection.execute(
+                select(campaign_rollups.c.MEDIA_BUYER).group_by(campaign_rollups.c.MEDIA_BUYER)
+                .order_by(first_active, campaign_rollups.c.MEDIA_BUYER)
+            ).scalars().all()
+            campaigns = connection.execute(
+                select(campaign_rollups.c.CAMPAIGN).group_by(campaign_rollups.c.CAMPAIGN)
+                .order_by(first_active, campaign_rollups.c.CAMPAIGN)
+            ).scalars().all()
+        return DatasetStats(rows, pd.Timestamp(min_date), pd.Timestamp(max_date), tuple(buyers), tuple(campaigns))
+
+    def _frame(self, statement, dates=True):
+        """Run a query into a DataFrame, parsing its ACTIVITY_DATE column."""
+        with self.engine.connect() as connection:
+            df = pd.read_sql(statement, connection)
+        if dates and "ACTIVITY_DATE" in df:
+            df["ACTIVITY_DATE"] = pd.to_datetime(df["ACTIVITY_DATE"]).astype("datetime64[ns]")
+        return df
+
+    @timed("SqlCampaignStore.media_buyers")
+    def media_buyers(self, start=None, end=None):
+        """
+        List the media buyers active within a date window.
+
+        Parameters:
+        - start (datetime, optional): The first date of the window. No lower bound if not provided.
+        - end (datetime, optional): The last date of the window. No upper bound if not provided.
+
+        Returns:
+        - list: The media buyers, in order of first activity within the window.
+        """
+        buyer = campaign_rollups.c.MEDIA_BUYER
+        statement = _within(select(buyer), start, end).group_by(buyer)
+        with self.engine.connect() as connection:
+            return connection.execute(
+                statement.order_by(func.min(campaign_rollups.c.ACTIVITY_DATE), buyer)
+            ).scalars().all()
+
+    @timed("SqlCampaignStore.campaigns")
+    def campaigns(self, media_buyer, start=None, end=None):
+        """
+        List the campaigns of a media buyer active within a date window.
+
+        Parameters:
+        - media_buyer (str): The media buyer.
+        - start (datetime, optional): The first date of the window. No lower bound if not provided.
+        - end (datetime, optional): The last date of the window. No upper bound if not provided.
+
+        Returns:
+        - list: The campaigns, in order of first activity within the window.
+        """
+        campaign = campaign_rollups.c.CAMPAIGN
+        statement = _within(select(campaign).where(campaign_rollups.c.MEDIA_BUYER == media_buyer), start, end)
+        with self.engine.connect() as connection:
+            return connection.execute(
+                statement.group_by(campaign).order_by(func.min(campaign_rollups.c.ACTIVITY_DATE), campaign)
+            ).scalars().all()
+
+    @timed("SqlCampaignStore.daily_metrics")
+    def daily_metrics(self, media_buyer, campaign, start=None, end=None, metrics=None):
+        """
+        Sum the metrics of a campaign for each activity date within a date window.
+
+        Parameters:
+        - media_buyer (str): The media buyer.
+        - campaign (str): The campaign.
+        - start (datetime, optional): The first date of the window. No lower bound if not provided.
+        - end (datetime, optional): The last date of the window. No upper bound if not provided.
+        - metrics (list, optional): The metric columns to sum. Defaults to DEFAULT_METRICS.
+
+        Returns:
+        - pd.DataFrame: The metrics indexed by activity date, like aggregate_metrics' output.
+        """
+        metrics = DEFAULT_METRICS if metrics is None else metrics
+        date = campaign_rollups.c.ACTIVITY_DATE
+        statement = _within(
+            select(date, *[func.sum(campaign_rollups.c[name]).label(name) for name in metrics])
+            .where(campaign_rollups.c.MEDIA_BUYER == media_buyer)
+            .where(campaign_rollups.c.CAMPAIGN == campaign),
+            start, end,
+        )
+        return self._frame(statement.group_by(date).order_by(date)).set_index("ACTIVITY_DATE")
+
+    @timed("SqlCampaignStore.buyer_totals")
+    def buyer_totals(self, start=None, end=None, metric="TOTAL_PROFIT"):
+        """
+        Total a metric for each media buyer active within a date window.
+
+        Parameters:
+        - start (datetime, optional): The first date of the window. No lower bound if not provided.
+        - end (datetime, optional): The last date of the window. No upper bound if not provided.
+        - metric (str, optional): The metric to total. Defaults to 'TOTAL_PROFIT'.
+
+        Returns:
+        - pd.DataFrame: One row per media buyer, ordered by media buyer, with 'MEDIA_BUYER' and metric columns.
+        """
+        buyer = campaign_rollups.c.MEDIA_BUYER
+        statement = _within(select(buyer, func.sum(campaign_rollups.c[metric]).label(metric)), start, end)
+        df = self._frame(statement.group_by(buyer).order_by(buyer), dates=False)
+        return df.astype({metric: "float64"})
+
+    @timed("SqlCampaignStore.buyer_daily_totals")
+    def buyer_daily_totals(self, metric="TOTAL_PROFIT"):
+        """
+        Total a metric for each activity date and media buyer.
+
+        Parameters:
+        - metric (str, optional): The metric to total. Defaults to 'TOTAL_PROFIT'.
+
+        Returns:
+        - pd.DataFrame: One row per date and active media buyer, with 'ACTIVITY_DATE', 'MEDIA_BUYER'
+          and metric columns, as generate_rank_history expects.
+        """
+        date, buyer = campaign_rollups.c.ACTIVITY_DATE, campaign_rollups.c.MEDIA_BUYER
+        statement = select(date, buyer, func.sum(campaign_rollups.c[metric]).label(metric))
+        return self._frame(statement.group_by(date, buyer).order_by(date, buyer))
+
+    @timed("SqlCampaignStore.leaderboard")
+    def leaderboard(self, end_date, frequency=None):
+        """
+        Generate a leaderboard based on total profit for a selected time period.
+
+        Parameters:
+        - end_date (str): The end date of the desired time period in 'YYYY-MM-DD' format.
+        - frequency (str, optional): The frequency to roll back to. Supported values are 'weekly',
+          'monthly', or 'yearly'. If not provided, the function will use the entire available data.
+
+        Returns:
+        - pd.DataFrame: The leaderboard, shaped like generate_leaderboard's output.
+        """
+        start_date, end_date = frequency_window(end_date, frequency)
+        return format_leaderboard(self.buyer_totals(start_date, end_date))
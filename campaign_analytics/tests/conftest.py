@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+# The app imports its modules as 'features.*' from the campaign_analytics folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing features.database opens 'database/user_presets.db' under the working directory, so the
+# tests run from a scratch directory instead of touching the app's saved profiles
+_scratch = tempfile.TemporaryDirectory()
+os.makedirs(os.path.join(_scratch.name, "database"))
+os.chdir(_scratch.name)
+
+@pytest.fixture
+def edit_middle_row():
+    """Return a function that changes the SPEND of a row in the middle of a CSV file, keeping the file's size."""
+    def edit(csv_path):
+        with open(csv_path, "rb") as f:
+            lines = f.readlines()
+        columns = lines[0].rstrip(b"\r\n").split(b",")
+        middle = len(lines) // 2
+        fields = lines[middle].split(b",")
+        spend = bytearray(fields[columns.index(b"SPEND")])
+        spend[0] = ord("1") if spend[0] != ord("1") else ord("2")
+        fields[columns.index(b"SPEND")] = bytes(spend)
+        lines[middle] = b",".join(fields)
+
+        stat = os.stat(csv_path)
+        with open(csv_path, "wb") as f:
+            f.writelines(lines)
+        # Move the modification time on, as a coarse filesystem clock might not
+        os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert os.path.getsize(csv_path) == stat.st_size
+    return edit
+
+class ImageServer:
+    """
+    A local HTTP server standing in for the origins images are downloaded from.
+
+    Attributes:
+        url (str): The server's base URL.
+        requests (list): The (path, headers) of every request received, in order.
+        max_active (int): The most requests handled at once so far.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.max_active = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        # Clients that time out close their connection mid-response; that is expected here
+        self._server.handle_error = lambda request, client_address: None
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def route(self, path, body=b"", status=200, delay=0, etag=None, last_modified=None, content_length=True):
+        """
+        Serve a response at a path and return its URL.
+
+        Parameters:
+        - path (str): The path, starting with '/'.
+        - body (bytes, optional): The response body.
+        - status (int, optional): The response status.
+        - delay (float, optional): Seconds to wait before responding.
+        - etag (str, optional): An ETag to send, answering a matching If-None-Match with 304.
+        - last_modified (str, optional): A Last-Modified date to send, answering a matching
+          If-Modified-Since with 304.
+        - content_length (bool, optional): Whether to announce the body's length.
+        """
+        self.routes[path] = dict(body=body, status=status, delay=delay, etag=etag,
+                                 last_modified=last_modified, content_length=content_length)
+        return self.url + path
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests.append((self.path, dict(self.headers)))
+                    server._active += 1
+                    server.max_active = max(server.max_active, server._active)
+                try:
+                    self._respond(server.routes.get(self.path))
+                finally:
+                    with server._lock:
+                        server._active -= 1
+
+            def _respond(self, route):
+                if route is None:
+                    self.send_error(404)
+                    return
+                time.sleep(route["delay"])
+                validators = {"ETag": route["etag"], "Last-Modified": route["last_modified"]}
+                if ((route["etag"] and self.headers.get("If-None-Match") == route["etag"])
+                        or (route["last_modified"] and self.headers.get("If-Modified-Since") == route["last_modified"])):
+                    status, body = 304, b""
+                else:
+                    status, body = route["status"], route["body"]
+                self.send_response(status)
+                for name, value in validators.items():
+                    if value:
+                        self.send_header(name, value)
+                if route["content_length"] and status != 304:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+@pytest.fixture
+def image_server():
+    """A local HTTP server, shut down after the test."""
+    server = ImageServer()
+    yield server
+    server.close()
+
+@pytest.fixture
+def png():
+    """Return a function encoding a solid PNG image of a given (width, height)."""
+    from io import BytesIO
+    from PIL import Image
+
+    def encode(size, color="red"):
+        buffer = BytesIO()
+        Image.new("RGB", size, color).save(buffer, "PNG")
+        return buffer.getvalue()
+    return encode
@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import inspect, text
+from features import database
+from features.database import Profile, engine, migrate_profiles_table
+
+INDEX_NAME = "ix_profiles_user_name_profile_name"
+
+@pytest.fixture
+def legacy_profiles():
+    """A 'profiles' table from before the unique index, holding duplicate profiles."""
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAME}"))
+        connection.execute(Profile.__table__.delete())
+        connection.execute(Profile.__table__.insert(), [
+            {"user_name": "ana", "profile_name": "weekly", "settings": {"v": 1}},
+            {"user_name": "ana", "profile_name": "weekly", "settings": {"v": 2}},
+            {"user_name": "ana", "profile_name": "monthly", "settings": {"v": 3}},
+        ])
+    yield
+    with engine.begin() as connection:
+        connection.execute(Profile.__table__.delete())
+
+def test_migration_keeps_the_latest_duplicate_and_adds_the_index(legacy_profiles):
+    migrate_profiles_table()
+
+    with engine.connect() as connection:
+        rows = connection.execute(Profile.__table__.select().order_by(Profile.profile_name)).all()
+    assert [(row.profile_name, row.settings) for row in rows] == [("monthly", {"v": 3}), ("weekly", {"v": 2})]
+    assert INDEX_NAME in {index["name"] for index in inspect(engine).get_indexes("profiles")}
+
+def test_migration_is_skipped_once_the_index_exists(legacy_profiles, monkeypatch):
+    migrate_profiles_table()
+
+    def begin():
+        raise AssertionError("the migration opened a write transaction")
+    monkeypatch.setattr(database.engine, "begin", begin)
+    migrate_profiles_table()
@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+from benchmarks.synthetic_data import write_campaign_csv
+from features.dataset import IncrementalLoader, count_data_rows, file_checksum, load_whole_file, read_appended_rows
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = str(tmp_path / "campaigns.csv")
+    write_campaign_csv(path, 2000, buyers=4, campaigns=30)
+    return path
+
+def read_lines(path):
+    with open(path, "rb") as f:
+        return f.readlines()
+
+def test_load_whole_file_starts_again_when_the_file_changes(csv_path):
+    lines = read_lines(csv_path)
+    with open(csv_path, "wb") as f:
+        f.writelines(lines[:100])
+    calls = []
+
+    def load(path):
+        # Rows land in the file during the first load only
+        calls.append(count_data_rows(path))
+        if len(calls) == 1:
+            with open(path, "ab") as f:
+                f.writelines(lines[100:200])
+        return len(calls)
+
+    loaded = load_whole_file(csv_path, load)
+
+    assert loaded.result == 2
+    assert calls == [99, 199]
+    assert (loaded.rows, loaded.offset, loaded.header) == (199, len(b"".join(lines[:200])), lines[0])
+    assert loaded.checksum == file_checksum(csv_path, loaded.offset)
+
+def test_read_appended_rows_leaves_an_incomplete_line(csv_path):
+    lines = read_lines(csv_path)
+    offset = len(b"".join(lines[:50]))
+    with open(csv_path, "wb") as f:
+        f.writelines(lines[:60])
+        f.write(lines[60][:5])
+    size = offset + len(b"".join(lines[50:60])) + 5
+
+    appended = read_appended_rows(csv_path, lines[0], offset, size)
+
+    assert len(appended.chunk) == 10
+    assert appended.offset == size - 5
+    assert appended.checksum == file_checksum(csv_path, appended.offset)
+    assert read_appended_rows(csv_path, lines[0], appended.offset, size) is None
+
+def test_appended_rows_give_the_rollups_of_a_full_load(csv_path):
+    lines = read_lines(csv_path)
+    with open(csv_path, "wb") as f:
+        f.writelines(lines[:1000])
+    loader = IncrementalLoader(csv_path)
+    loader.refresh()
+
+    with open(csv_path, "ab") as f:
+        f.writelines(lines[1000:])
+    assert loader.refresh()
+
+    reference = IncrementalLoader(csv_path)
+    reference.refresh()
+    assert loader.handle.stats == reference.handle.stats
+    for level, rollup in reference.rollups.items():
+        pd.testing.assert_frame_equal(loader.rollups[level], rollup, check_categorical=False, rtol=1e-5)
+
+def test_edit_in_the_middle_of_ingested_rows_reloads_the_file(csv_path, edit_middle_row):
+    loader = IncrementalLoader(csv_path)
+    loader.refresh()
+    spend = loader.rollups[("ACTIVITY_DATE",)]["SPEND"].sum()
+
+    edit_middle_row(csv_path)
+    assert loader.refresh()
+    assert loader.rollups[("ACTIVITY_DATE",)]["SPEND"].sum() != spend
+
+    reference = IncrementalLoader(csv_path)
+    reference.refresh()
+    assert loader.version.checksum == reference.version.checksum
+    for level, rollup in reference.rollups.items():
+        pd.testing.assert_frame_equal(loader.rollups[level], rollup)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from features.date_index import DateIndex
+from features.shared_cache import SharedCache, estimate_bytes
+
+def campaign_rows():
+    return pd.DataFrame({
+        "ACTIVITY_DATE": pd.to_datetime(["2023-01-02", "2023-01-01", "2023-01-02", "2023-01-03"]),
+        "MEDIA_BUYER": ["Tom", "Alice", "Alice", "Tom"],
+        "CAMPAIGN": ["B", "A", "A", "B"],
+        "CLICKS": [3, 1, 2, 4],
+    })
+
+def test_lookup_matches_keys_within_the_window():
+    index = DateIndex(campaign_rows(), keys=[("MEDIA_BUYER", "CAMPAIGN"), ("MEDIA_BUYER",)])
+
+    assert index.lookup({"MEDIA_BUYER": "Tom", "CAMPAIGN": "B"}, start="2023-01-03")["CLICKS"].tolist() == [4]
+    assert index.lookup({"MEDIA_BUYER": "Alice"})["CLICKS"].tolist() == [1, 2]
+    assert index.lookup({"MEDIA_BUYER": "Nobody"}).empty
+
+def test_lookup_of_unindexed_keys_fails():
+    index = DateIndex(campaign_rows(), keys=[("MEDIA_BUYER",)])
+
+    with pytest.raises(KeyError):
+        index.lookup({"CAMPAIGN": "A"})
+
+def test_cached_size_includes_the_key_positions():
+    rows = 10000
+    df = pd.DataFrame({
+        "ACTIVITY_DATE": pd.Timestamp("2023-01-01") + pd.to_timedelta(np.arange(rows) % 30, unit="D"),
+        "MEDIA_BUYER": np.arange(rows),
+        "CLICKS": np.ones(rows, dtype=np.int64),
+    })
+    cache = SharedCache()
+
+    index = cache.get_or_compute("index", lambda: DateIndex(df, keys=[("MEDIA_BUYER",)]))
+    positions_bytes = estimate_bytes(index._key_positions)
+    index.lookup({"MEDIA_BUYER": 5})
+
+    # Lookups add nothing the cache did not measure when the index was stored
+    assert cache.stats()["bytes"] == estimate_bytes(index)
+    assert cache.stats()["bytes"] >= estimate_bytes(index.frame) + positions_bytes
+
+def test_positionally_indexed_frame_is_kept_without_copying():
+    df = campaign_rows().sort_values("ACTIVITY_DATE", ignore_index=True)
+
+    assert DateIndex(df).frame is df
+
+def test_frame_is_sorted_and_positionally_indexed():
+    index = DateIndex(campaign_rows().set_index("CAMPAIGN", drop=False))
+
+    assert isinstance(index.frame.index, pd.RangeIndex)
+    assert index.frame["CLICKS"].tolist() == [1, 3, 2, 4]
+
+def test_index_over_a_pinned_rollup_does_not_count_it_again():
+    rollup = campaign_rows().sort_values("ACTIVITY_DATE", ignore_index=True)
+    cache = SharedCache()
+    cache.pin("dataset", {"rollups": {"cube": rollup}})
+    pinned_bytes = cache.stats()["bytes"]
+
+    index = cache.get_or_compute("index", lambda: DateIndex(rollup, keys=[("MEDIA_BUYER",)]))
+
+    assert index.frame is rollup
+    index_bytes = cache.stats()["bytes"] - pinned_bytes
+    assert index_bytes == estimate_bytes(index) - estimate_bytes(rollup)
+    assert cache.report().set_index("key").loc["'index'", "bytes"] == index_bytes
@@ -0,0 +1,150 @@
+import os
+import time
+import hashlib
+import pytest
+from features.image_cache import ImageCache
+from features.image_search import create_session
+
+@pytest.fixture
+def http():
+    session = create_session()
+    yield session
+    session.close()
+
+def blob_path(cache, content):
+    return os.path.join(cache.directory, "blobs", hashlib.sha256(content).hexdigest())
+
+def record_path(cache, url):
+    return os.path.join(cache.directory, "urls", hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+def set_age(path, seconds):
+    """Make a cached file look last used some seconds ago."""
+    used = time.time() - seconds
+    os.utime(path, (used, used))
+
+def test_fresh_entries_are_served_without_a_request(tmp_path, image_server, http, png):
+    cache = ImageCache(str(tmp_path), max_age=3600)
+    url = image_server.route("/a.png", png((4, 4)), etag='"v1"')
+
+    assert cache.fetch(url, http) == cache.fetch(url, http) == png((4, 4))
+    assert len(image_server.requests) == 1
+
+def test_stale_entries_are_revalidated_with_their_validators(tmp_path, image_server, http, png):
+    cache = ImageCache(str(tmp_path), max_age=0)
+    modified = "Wed, 01 Mar 2023 10:00:00 GMT"
+    url = image_server.route("/a.png", png((4, 4)), etag='"v1"', last_modified=modified)
+    cache.fetch(url, http)
+
+    # The origin's body changes but its validators do not, so a 304 must serve the cached bytes
+    image_server.route("/a.png", png((9, 9)), etag='"v1"', last_modified=modified)
+    assert cache.fetch(url, http) == png((4, 4))
+
+    _, headers = image_server.requests[-1]
+    assert headers["If-None-Match"] == '"v1"'
+    assert headers["If-Modified-Since"] == modified
+
+def test_changed_entries_are_downloaded_again(tmp_path, image_server, http, png):
+    cache = ImageCache(str(tmp_path), max_age=0)
+    url = image_server.route("/a.png", png((4, 4)), etag='"v1"')
+    cache.fetch(url, http)
+
+    image_server.route("/a.png", png((9, 9)), etag='"v2"')
+    assert cache.fetch(url, http) == png((9, 9))
+
+    # The new validator is the one sent next time
+    cache.fetch(url, http)
+    assert image_server.requests[-1][1]["If-None-Match"] == '"v2"'
+
+def test_entries_without_validators_are_not_revalidated(tmp_path, image_server, http, png):
+    cache = ImageCache(str(tmp_path), max_age=0)
+    url = image_server.route("/a.png", png((4, 4)))
+
+    cache.fetch(url, http)
+    cache.fetch(url, http)
+
+    assert len(image_server.requests) == 1
+
+def test_eviction_keeps_the_cache_within_its_budget(tmp_path, png):
+    cache = ImageCache(str(tmp_path), max_bytes=10 ** 9)
+    images = {f"https://example.com/{i}.png": png((20 + i, 20), (i, 0, 0)) for i in range(20)}
+    for url, content in images.items():
+        cache.store(url, content)
+    budget = cache.size() // 2
+
+    cache.max_bytes = budget
+    cache.store("https://example.com/last.png", png((50, 50), "blue"))
+
+    assert cache.size() <= budget
+    assert os.path.exists(record_path(cache, "https://example.com/last.png"))
+    assert not os.path.exists(record_path(cache, "https://example.com/0.png"))
+
+def test_image_is_removed_with_its_last_url_record(tmp_path, png):
+    cache = ImageCache(str(tmp_path), max_bytes=10 ** 9)
+    shared, other = png((30, 30)), png((40, 40), "blue")
+    cache.store("https://a.example/x.png", shared)
+    cache.store("https://b.example/x.png", shared)
+    cache.store("https://c.example/y.png", other)
+    cache.thumbnail("https://a.example/x.png", (10, 10))
+
+    # The two records of the shared image are the least recently used files
+    set_age(record_path(cache, "https://a.example/x.png"), 1000)
+    set_age(record_path(cache, "https://b.example/x.png"), 900)
+    set_age(blob_path(cache, shared), 800)
+
+    # Evicting one record keeps the image the other still points to
+    cache.max_bytes = cache.size() - 1
+    cache.evict()
+    assert not os.path.exists(record_path(cache, "https://a.example/x.png"))
+    assert os.path.exists(blob_path(cache, shared))
+
+    # Evicting the last one removes the image and its thumbnail too
+    cache.max_bytes = cache.size() - 1
+    cache.evict()
+    assert not os.path.exists(record_path(cache, "https://b.example/x.png"))
+    assert not os.path.exists(blob_path(cache, shared))
+    assert os.listdir(os.path.join(cache.directory, "thumbs")) == []
+    assert os.path.exists(blob_path(cache, other))
+
+def test_records_of_an_evicted_image_are_removed(tmp_path, png):
+    cache = ImageCache(str(tmp_path), max_bytes=10 ** 9)
+    content = png((30, 30))
+    cache.store("https://a.example/x.png", content)
+    cache.store("https://b.example/x.png", content)
+    cache.store("https://c.example/y.png", png((40, 40), "blue"))
+
+    set_age(blob_path(cache, content), 1000)
+    cache.max_bytes = cache.size() - 1
+    cache.evict()
+
+    assert not os.path.exists(blob_path(cache, content))
+    assert not os.path.exists(record_path(cache, "https://a.example/x.png"))
+    assert not os.path.exists(record_path(cache, "https://b.example/x.png"))
+    assert os.path.exists(record_path(cache, "https://c.example/y.png"))
+
+def test_url_whose_image_is_gone_is_downloaded_again(tmp_path, image_server, http, png):
+    cache = ImageCache(str(tmp_path), max_age=3600)
+    url = image_server.route("/a.png", png((4, 4)), etag='"v1"')
+    cache.fetch(url, http)
+    os.remove(blob_path(cache, png((4, 4))))
+
+    assert cache.fetch(url, http) == png((4, 4))
+
+    # No conditional request: the stale record was dropped rather than revalidated
+    assert len(image_server.requests) == 2
+    assert "If-None-Match" not in image_server.requests[-1][1]
+    assert os.path.exists(blob_path(cache, png((4, 4))))
+
+def test_new_unreferenced_images_are_spared(tmp_path, png):
+    cache = ImageCache(str(tmp_path), max_bytes=10 ** 9)
+    cache.store("https://a.example/x.png", png((30, 30)))
+    cache.store("https://b.example/y.png", png((40, 40), "blue"))
+
+    # An image whose record has not been written yet, as in the middle of store()
+    pending = png((50, 50), "green")
+    with open(blob_path(cache, pending), "wb") as f:
+        f.write(pending)
+    set_age(record_path(cache, "https://a.example/x.png"), 1000)
+    cache.max_bytes = cache.size() - 1
+    cache.evict()
+
+    assert os.path.exists(blob_path(cache, pending))
@@ -0,0 +1,171 @@
+import pytest
+from collections import namedtuple
+from features.image_search import (CHUNK_BYTES, ImageResult, SearchResultCache, create_session, download_images,
+                                   fetch_image_bytes, read_limited, search_images)
+
+FakeImage = namedtuple("FakeImage", ["url", "description"])
+
+class FakeClock:
+    """A clock the tests move forward by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeSearchClient:
+    """Stands in for GoogleImagesSearch, returning one result per search that names the query."""
+
+    def __init__(self):
+        self.searches = []
+
+    def search(self, search_params):
+        self.searches.append(dict(search_params))
+
+    def results(self):
+        query = self.searches[-1]["q"]
+        return [FakeImage(f"https://example.com/{query}.png", f"{query} image")]
+
+def params(q, num=1, safe="off"):
+    return {"q": q, "num": num, "safe": safe}
+
+def test_search_miss_queries_client_and_hit_reuses_results():
+    client, cache = FakeSearchClient(), SearchResultCache(clock=FakeClock())
+
+    first = search_images(client, params("cats"), cache=cache)
+    second = search_images(client, params("cats"), cache=cache)
+
+    assert first == second == [ImageResult("https://example.com/cats.png", "cats image")]
+    assert len(client.searches) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "queries": 1}
+
+def test_search_without_cache_always_queries_client():
+    client = FakeSearchClient()
+
+    search_images(client, params("cats"), cache=None)
+    search_images(client, params("cats"), cache=None)
+
+    assert len(client.searches) == 2
+
+def test_cached_results_cannot_be_mutated_by_callers():
+    client, cache = FakeSearchClient(), SearchResultCache(clock=FakeClock())
+
+    search_images(client, params("cats"), cache=cache).clear()
+
+    assert len(search_images(client, params("cats"), cache=cache)) == 1
+    assert len(client.searches) == 1
+
+def test_results_expire_after_ttl():
+    clock, client = FakeClock(), FakeSearchClient()
+    cache = SearchResultCache(ttl=60, clock=clock)
+    search_images(client, params("cats"), cache=cache)
+
+    clock.now += 60
+    search_images(client, params("cats"), cache=cache)
+    assert len(client.searches) == 1
+
+    clock.now += 1
+    search_images(client, params("cats"), cache=cache)
+    assert len(client.searches) == 2
+    assert cache.stats() == {"hits": 1, "misses": 2, "queries": 1}
+
+def test_least_recently_used_query_is_evicted_at_capacity():
+    client, cache = FakeSearchClient(), SearchResultCache(max_entries=2, clock=FakeClock())
+    search_images(client, params("cats"), cache=cache)
+    search_images(client, params("dogs"), cache=cache)
+
+    # Reading 'cats' makes 'dogs' the least recently used
+    search_images(client, params("cats"), cache=cache)
+    search_images(client, params("birds"), cache=cache)
+
+    assert cache.stats()["queries"] == 2
+    assert cache.get(params("cats")) is not None
+    assert cache.get(params("birds")) is not None
+    assert cache.get(params("dogs")) is None
+
+def test_equivalent_queries_share_a_key():
+    key = SearchResultCache.key
+
+    assert key(params("  Red   Cats ")) == key(params("red cats")) == ("red cats", 1, "off")
+    assert key({"q": "cats", "num": "3", "safe": "OFF"}) == key(params("cats", num=3))
+    assert key({"q": "cats"}) == key(params("cats"))
+
+def test_different_queries_do_not_share_a_key():
+    key = SearchResultCache.key
+
+    assert key(params("cats")) != key(params("cats", num=2))
+    assert key(params("cats")) != key(params("cats", safe="high"))
+    assert key(params("cats")) != key(params("red cats"))
+
+def test_normalized_query_is_answered_from_cache():
+    client, cache = FakeSearchClient(), SearchResultCache(clock=FakeClock())
+
+    search_images(client, params("Red Cats"), cache=cache)
+    search_images(client, params("  red  cats"), cache=cache)
+
+    assert len(client.searches) == 1
+
+@pytest.fixture
+def http():
+    session = create_session()
+    yield session
+    session.close()
+
+def test_downloads_keep_the_order_of_their_images(image_server, http, png):
+    # Earlier images answer more slowly, so they finish last
+    sizes = [(10 + i, 5 + i) for i in range(6)]
+    images = [FakeImage(image_server.route(f"/{i}.png", png(size), delay=0.05 * (len(sizes) - i)), "")
+              for i, size in enumerate(sizes)]
+
+    results = download_images(images, max_workers=6, http=http)
+
+    assert [img.size for img in results] == sizes
+
+def test_downloads_stay_within_the_worker_cap(image_server, http, png):
+    images = [FakeImage(image_server.route(f"/{i}.png", png((8, 8)), delay=0.1), "") for i in range(6)]
+
+    results = download_images(images, max_workers=2, http=http)
+
+    assert all(img is not None for img in results)
+    assert image_server.max_active == 2
+
+def test_oversized_bodies_are_refused(image_server, http):
+    announced = image_server.route("/announced.png", b"x" * 5000)
+    streamed = image_server.route("/streamed.png", b"x" * 5000, content_length=False)
+
+    for url in (announced, streamed):
+        with pytest.raises(ValueError):
+            fetch_image_bytes(url, http, max_bytes=1000)
+    assert fetch_image_bytes(streamed, http, max_bytes=5000) == b"x" * 5000
+
+def test_streamed_body_is_read_only_up_to_the_limit(http):
+    class Response:
+        url = "https://example.com/huge.png"
+        headers = {}
+        chunks_read = 0
+
+        def iter_content(self, chunk_bytes):
+            while True:
+                Response.chunks_read += 1
+                yield b"x" * chunk_bytes
+
+    with pytest.raises(ValueError):
+        read_limited(Response(), max_bytes=3 * CHUNK_BYTES)
+    assert Response.chunks_read == 4
+
+def test_failed_downloads_give_none_without_failing_the_batch(image_server, http, png):
+    images = [
+        FakeImage(image_server.route("/ok.png", png((12, 7))), ""),
+        FakeImage(image_server.url + "/missing.png", ""),
+        FakeImage(image_server.route("/slow.png", png((8, 8)), delay=1), ""),
+        FakeImage(image_server.route("/huge.png", png((12, 7)) + b"\0" * 5000), ""),
+        FakeImage(image_server.route("/broken.png", b"not an image"), ""),
+        FakeImage(image_server.route("/also-ok.png", png((3, 4))), ""),
+    ]
+
+    results = download_images(images, http=http, timeout=(1, 0.2), max_bytes=1000)
+
+    assert results[0].size == (12, 7)
+    assert results[1:5] == [None, None, None, None]
+    assert results[5].size == (3, 4)
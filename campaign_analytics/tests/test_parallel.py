@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+from benchmarks.synthetic_data import write_campaign_csv
+from features.aggregation import aggregate_metrics
+from features.dataset import load_dataset
+from features import parallel
+from features.parallel import parallel_aggregate_metrics, _partition_rows
+
+@pytest.fixture(scope="module")
+def campaign_data(tmp_path_factory):
+    csv_path = tmp_path_factory.mktemp("parallel") / "campaigns.csv"
+    write_campaign_csv(str(csv_path), 20000, buyers=7, campaigns=60)
+    return load_dataset(str(csv_path))
+
+@pytest.mark.parametrize("by, partition_by", [
+    (["ACTIVITY_DATE", "MEDIA_BUYER", "CAMPAIGN"], None),
+    (["ACTIVITY_DATE", "MEDIA_BUYER", "CAMPAIGN"], "ACTIVITY_DATE"),
+    (["ACTIVITY_DATE", "MEDIA_BUYER"], None),
+    (["ACTIVITY_DATE", "MEDIA_BUYER"], "ACTIVITY_DATE"),
+    ("ACTIVITY_DATE", None),
+])
+def test_pool_matches_serial_aggregation_exactly(campaign_data, by, partition_by, monkeypatch):
+    # Fail rather than pass if the aggregation quietly falls back to the calling process
+    pools = []
+    get_pool = parallel.get_pool
+    monkeypatch.setattr(parallel, "get_pool", lambda: pools.append(get_pool()) or pools[-1])
+
+    serial = aggregate_metrics(campaign_data, by=by)
+    result = parallel_aggregate_metrics(campaign_data, by=by, partition_by=partition_by, workers=2, min_rows=0)
+
+    assert pools
+    pd.testing.assert_frame_equal(serial, result, check_exact=True)
+
+def test_partitions_never_split_a_key():
+    values = pd.Series(["b", "a", "c", "a", "b", "b", "d", "c"]).to_numpy()
+
+    order, bounds = _partition_rows(values, 3)
+
+    partitions = [set(values[order[low:high]]) for low, high in bounds]
+    assert len(bounds) > 1
+    assert sum(len(partition) for partition in partitions) == len(set(values))
+    assert sorted(order) == list(range(len(values)))
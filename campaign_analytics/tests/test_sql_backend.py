@@ -0,0 +1,133 @@
+import pandas as pd
+import pytest
+from benchmarks.synthetic_data import write_campaign_csv
+from features.activity_index import CampaignActivityIndex
+from features.aggregation import aggregate_metrics
+from features.dataset import IncrementalLoader
+from features.date_index import DateIndex
+from features.leaderboard import generate_leaderboard, generate_rank_history
+from features.rollup import ROLLUP_LEVELS, select_rollup
+from features.sql_backend import SqlCampaignStore
+
+CAMPAIGN_LEVEL, BUYER_LEVEL = ROLLUP_LEVELS[0], ROLLUP_LEVELS[1]
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = str(tmp_path / "campaigns.csv")
+    write_campaign_csv(path, 3000, buyers=5, campaigns=40)
+    return path
+
+def pandas_reference(csv_path):
+    """Load the file the way the pandas backend does."""
+    loader = IncrementalLoader(csv_path)
+    loader.refresh()
+    return loader
+
+def windows(stats):
+    """Date windows of the dropdowns and charts: open, the last week and the last month."""
+    return [(None, None), (stats.max_date - pd.Timedelta(days=6), stats.max_date),
+            (stats.max_date - pd.Timedelta(days=30), None)]
+
+def assert_same_data(store, reference):
+    """Check every query the SQL backend answers against the pandas backend."""
+    assert store.handle.stats == reference.handle.stats
+
+    cube = select_rollup(reference.rollups, CAMPAIGN_LEVEL)
+    activity_index, date_index = CampaignActivityIndex(cube), DateIndex(cube, keys=[CAMPAIGN_LEVEL[1:]])
+    for start, end in windows(reference.handle.stats):
+        buyers = store.media_buyers(start, end)
+        assert buyers == activity_index.buyers(start, end)
+        for buyer in buyers:
+            campaigns = store.campaigns(buyer, start, end)
+            assert campaigns == activity_index.campaigns(buyer, start, end)
+            for campaign in campaigns[:3]:
+                expected = aggregate_metrics(date_index.lookup({"MEDIA_BUYER": buyer, "CAMPAIGN": campaign}, start, end))
+                pd.testing.assert_frame_equal(store.daily_metrics(buyer, campaign, start, end), expected,
+                                              check_dtype=False, rtol=1e-5)
+
+def test_lists_and_daily_metrics_match_pandas(csv_path):
+    store = SqlCampaignStore(csv_path, chunk_rows=997)
+
+    assert store.refresh()
+    assert_same_data(store, pandas_reference(csv_path))
+
+@pytest.mark.parametrize("frequency", [None, "weekly", "monthly", "yearly"])
+def test_leaderboard_matches_pandas(csv_path, frequency):
+    store = SqlCampaignStore(csv_path)
+    store.refresh()
+    buyer_rollup = select_rollup(pandas_reference(csv_path).rollups, BUYER_LEVEL)
+
+    # Names come back from SQL as strings rather than categories
+    for end_date in ("2023-06-30", str(store.handle.stats.max_date.date())):
+        expected = generate_leaderboard(buyer_rollup, end_date, frequency)
+        pd.testing.assert_frame_equal(store.leaderboard(end_date, frequency), expected.astype({"NAME": str}),
+                                      check_dtype=False, rtol=1e-4)
+
+def test_buyer_daily_totals_match_pandas(csv_path):
+    store = SqlCampaignStore(csv_path)
+    store.refresh()
+    buyer_rollup = select_rollup(pandas_reference(csv_path).rollups, BUYER_LEVEL)
+
+    totals = store.buyer_daily_totals()
+    expected = buyer_rollup[["ACTIVITY_DATE", "MEDIA_BUYER", "TOTAL_PROFIT"]]
+    pd.testing.assert_frame_equal(totals, expected.astype({"MEDIA_BUYER": str}).reset_index(drop=True),
+                                  check_dtype=False, rtol=1e-4)
+
+    # The rank history drawn from either is the same; rolling sums of float32 profits can cancel to
+    # near zero, so the totals are compared to the cent
+    for frequency in ("weekly", "monthly"):
+        sql_totals, sql_ranks = generate_rank_history(totals, frequency)
+        window_totals, ranks = generate_rank_history(buyer_rollup, frequency)
+        pd.testing.assert_frame_equal(sql_totals.rename(columns=str), window_totals.rename(columns=str), check_names=False,
+                                      check_column_type=False, check_freq=False, rtol=1e-4, atol=0.01)
+        pd.testing.assert_frame_equal(sql_ranks.rename(columns=str), ranks.rename(columns=str), check_names=False,
+                                      check_column_type=False, check_freq=False)
+
+def test_append_refresh_matches_a_full_load(csv_path):
+    with open(csv_path) as f:
+        lines = f.readlines()
+    half = len(lines) // 2
+    with open(csv_path, "w") as f:
+        f.writelines(lines[:half])
+    store = SqlCampaignStore(csv_path, chunk_rows=997)
+    store.refresh()
+
+    # An incomplete last line is left for the next refresh
+    with open(csv_path, "a") as f:
+        f.writelines(lines[half:-1])
+        f.write(lines[-1][:10])
+    assert store.refresh()
+    assert store.handle.stats.rows == len(lines) - 2
+
+    with open(csv_path, "a") as f:
+        f.write(lines[-1][10:])
+    assert store.refresh()
+    assert not store.refresh()
+    assert_same_data(store, pandas_reference(csv_path))
+
+def test_rewrite_refresh_reloads_the_file(csv_path):
+    store = SqlCampaignStore(csv_path)
+    store.refresh()
+
+    with open(csv_path) as f:
+        lines = f.readlines()
+    with open(csv_path, "w") as f:
+        f.writelines(lines[:500])
+    assert store.refresh()
+    assert store.handle.stats.rows == 499
+    assert_same_data(store, pandas_reference(csv_path))
+
+    # Another process sharing the database picks up the reload without repeating it
+    other = SqlCampaignStore(csv_path)
+    assert other.refresh()
+    assert other.version == store.version
+
+def test_edit_in_the_middle_of_loaded_rows_reloads_the_file(csv_path, edit_middle_row):
+    store = SqlCampaignStore(csv_path)
+    store.refresh()
+    version = store.version
+
+    edit_middle_row(csv_path)
+    assert store.refresh()
+    assert store.version.checksum != version.checksum
+    assert_same_data(store, pandas_reference(csv_path))